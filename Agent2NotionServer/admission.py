@@ -0,0 +1,249 @@
+"""Cost-aware admission control for the API endpoints.
+
+Every request declares an estimated cost (a ``/search-notion`` fans out into
+several LLM and Notion calls, an ``/add-to-notion`` usually into one or two)
+and a priority. A request runs once there is a free worker slot, its API key
+is under its concurrency limit and the key's budget covers the cost;
+otherwise it waits in a bounded priority queue until it can run or times out.
+Budgets refill continuously, like a token bucket.
+"""
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+ADMISSION_CAPACITY = int(os.getenv("NOTION_ADMISSION_CAPACITY", "16"))
+ADMISSION_KEY_CONCURRENCY = int(os.getenv("NOTION_ADMISSION_KEY_CONCURRENCY", "4"))
+ADMISSION_BUDGET = float(os.getenv("NOTION_ADMISSION_BUDGET", "120"))
+ADMISSION_REFILL = float(os.getenv("NOTION_ADMISSION_REFILL", "2"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("NOTION_ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_TIMEOUT = float(os.getenv("NOTION_ADMISSION_TIMEOUT", "15"))
+
+# Request priorities; lower values are admitted first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SEARCH = 1
+PRIORITY_BATCH = 2
+
+# Number of recent queue waits kept for the wait-time percentiles.
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """A request could not be admitted.
+
+    ``reason`` is ``"queue_full"``, ``"timeout"`` or ``"over_budget"`` and
+    ``retry_after`` a hint in seconds for the client.
+    """
+
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "active")
+
+    def __init__(self, tokens: float) -> None:
+        self.tokens = tokens
+        self.updated = time.monotonic()
+        self.active = 0
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "key", "cost", "slots", "future")
+
+    def __init__(self, priority: int, seq: int, key: str, cost: float, slots: int, future: asyncio.Future) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.cost = cost
+        self.slots = slots
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Admit requests by priority within per-key concurrency limits and cost budgets.
+
+    Parameters
+    ----------
+    capacity : int
+        Requests allowed to run at once across all keys.
+    key_concurrency : int
+        Requests one API key may run at once. Keeping this below
+        ``capacity`` stops one expensive tenant from occupying every slot.
+    budget : float
+        Cost units a key can spend in a burst.
+    refill : float
+        Cost units per second each key's budget is refilled with.
+    queue_size : int
+        Requests allowed to wait; further requests are rejected at once.
+    timeout : float
+        Seconds a request may wait before it is rejected.
+    """
+
+    def __init__(
+        self,
+        capacity: int = ADMISSION_CAPACITY,
+        key_concurrency: int = ADMISSION_KEY_CONCURRENCY,
+        budget: float = ADMISSION_BUDGET,
+        refill: float = ADMISSION_REFILL,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        timeout: float = ADMISSION_TIMEOUT,
+    ) -> None:
+        self.capacity = capacity
+        self.key_concurrency = key_concurrency
+        self.budget = budget
+        self.refill = refill
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.stats = {"admitted": 0, "queued": 0, "queue_full": 0, "timeout": 0, "over_budget": 0}
+        self._buckets: Dict[str, _Bucket] = {}
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._refill_timer: asyncio.TimerHandle | None = None
+
+    def _bucket(self, key: str) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.budget)
+        now = time.monotonic()
+        bucket.tokens = min(self.budget, bucket.tokens + (now - bucket.updated) * self.refill)
+        bucket.updated = now
+        return bucket
+
+    def _can_run(self, key: str, cost: float, slots: int = 1) -> bool:
+        bucket = self._bucket(key)
+        return (
+            self.active + slots <= self.capacity
+            and bucket.active + slots <= self.key_concurrency
+            and bucket.tokens >= cost
+        )
+
+    def _start(self, key: str, cost: float, slots: int = 1) -> None:
+        bucket = self._bucket(key)
+        bucket.tokens -= cost
+        bucket.active += slots
+        self.active += slots
+        self.stats["admitted"] += 1
+
+    def clamp_slots(self, slots: int) -> int:
+        """The number of worker slots a request asking for ``slots`` is given."""
+        return max(1, min(slots, self.capacity, self.key_concurrency))
+
+    def _dispatch(self) -> None:
+        """Admit waiting requests in priority order, skipping keys that cannot run yet."""
+        if self._refill_timer is not None:
+            self._refill_timer.cancel()
+            self._refill_timer = None
+        blocked_on_budget: List[_Waiter] = []
+        for waiter in sorted(self._queue):
+            if self.active >= self.capacity:
+                break
+            if waiter.future.done():
+                continue
+            if self._can_run(waiter.key, waiter.cost, waiter.slots):
+                self._start(waiter.key, waiter.cost, waiter.slots)
+                waiter.future.set_result(None)
+            elif self._buckets[waiter.key].tokens < waiter.cost:
+                blocked_on_budget.append(waiter)
+        self._queue = [w for w in self._queue if not w.future.done()]
+
+        # Nothing releases a slot when a request is only waiting for its budget,
+        # so wake up again once the cheapest of them can be afforded.
+        if blocked_on_budget and self.refill > 0 and self.active < self.capacity:
+            delay = min((w.cost - self._buckets[w.key].tokens) / self.refill for w in blocked_on_budget)
+            self._refill_timer = asyncio.get_running_loop().call_later(max(delay, 0.0), self._dispatch)
+
+    def _release(self, key: str, slots: int = 1) -> None:
+        self._buckets[key].active -= slots
+        self.active -= slots
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        key: str,
+        cost: float = 1.0,
+        priority: int = PRIORITY_INTERACTIVE,
+        slots: int = 1,
+    ) -> AsyncIterator[None]:
+        """Hold worker slots for ``key`` while the block runs.
+
+        A request that runs several upstream calls at once (a batch) asks for
+        ``slots`` > 1; it counts that many times against the capacity and the
+        key's concurrency limit, see ``clamp_slots``. Costs above the budget
+        are capped at the budget.
+
+        Raises ``AdmissionRejected`` if the queue is full, the cost cannot be
+        afforded within the timeout, or the wait times out.
+        """
+        cost = min(cost, self.budget)
+        slots = self.clamp_slots(slots)
+        if not any(w.key == key or w.priority <= priority for w in self._queue) and self._can_run(key, cost, slots):
+            self._start(key, cost, slots)
+        else:
+            await self._wait(key, cost, priority, slots)
+        try:
+            yield
+        finally:
+            self._release(key, slots)
+
+    async def _wait(self, key: str, cost: float, priority: int, slots: int) -> None:
+        if len(self._queue) >= self.queue_size:
+            self.stats["queue_full"] += 1
+            raise AdmissionRejected("queue_full", self.timeout)
+        shortfall = cost - self._bucket(key).tokens
+        if shortfall > 0:
+            refill_wait = shortfall / self.refill if self.refill > 0 else float("inf")
+            if refill_wait > self.timeout:
+                self.stats["over_budget"] += 1
+                raise AdmissionRejected("over_budget", refill_wait if self.refill > 0 else self.timeout)
+
+        waiter = _Waiter(priority, next(self._seq), key, cost, slots, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self.stats["queued"] += 1
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done():
+                # Admitted just as the wait ended: hand the slots back.
+                self._release(key, slots)
+            else:
+                waiter.future.cancel()
+                self._queue.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timeout"] += 1
+                raise AdmissionRejected("timeout", self.timeout) from None
+            raise
+        finally:
+            self._waits.append(time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, current queue depth and recent queue wait times in seconds."""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4) if waits else 0.0
+
+        return {
+            **self.stats,
+            "active": self.active,
+            "queue_depth": len(self._queue),
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": round(waits[-1], 4) if waits else 0.0,
+        }
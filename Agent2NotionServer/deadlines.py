@@ -0,0 +1,126 @@
+"""Request deadlines carried in the async context.
+
+``deadline(seconds)`` sets an absolute deadline for everything awaited inside
+it, including tasks created there, since they copy the current context.
+Outbound calls are wrapped in ``within_deadline`` so they give up once the
+request's time is spent instead of running without a timeout.
+
+Work shared by several requests (see ``singleflight``) runs under a
+``SharedDeadline``: the latest deadline among the requests waiting for it,
+extended whenever another request joins.
+"""
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Any, Awaitable, Coroutine, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class _Deadline:
+    """An absolute deadline, also bounded by the deadline it was set under."""
+
+    __slots__ = ("ends", "parent")
+
+    def __init__(self, ends: float | None, parent: "_Deadline | None" = None) -> None:
+        self.ends = ends
+        self.parent = parent
+
+    def remaining(self) -> float | None:
+        left = None if self.ends is None else self.ends - time.monotonic()
+        if self.parent is not None:
+            outer = self.parent.remaining()
+            if outer is not None:
+                left = outer if left is None else min(left, outer)
+        return left
+
+
+_deadline: ContextVar[_Deadline | None] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current request ran out of time."""
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Run the block with a deadline ``seconds`` from now.
+
+    An enclosing, earlier deadline is kept. ``None`` leaves the current
+    deadline unchanged.
+    """
+    if seconds is None:
+        yield
+        return
+    token = _deadline.set(_Deadline(time.monotonic() + seconds, _deadline.get()))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline, or ``None`` without one."""
+    current = _deadline.get()
+    return None if current is None else current.remaining()
+
+
+def _current_ends() -> float | None:
+    left = remaining()
+    return None if left is None else time.monotonic() + left
+
+
+class SharedDeadline:
+    """The deadline of work started by one request and awaited by others.
+
+    It starts as the current request's deadline and is moved out by
+    ``join`` to the latest deadline of any request that waits for the work
+    (or removed, if one of them has none).
+    """
+
+    def __init__(self) -> None:
+        self._deadline = _Deadline(_current_ends())
+        self._context: Context = copy_context()
+        self._context.run(_deadline.set, self._deadline)
+
+    def start(self, coro: Coroutine[Any, Any, T]) -> "asyncio.Task[T]":
+        """Run ``coro`` as a task under this deadline."""
+        return self._context.run(asyncio.ensure_future, coro)
+
+    def join(self) -> None:
+        """Extend the deadline to the current request's, if that is later."""
+        if self._deadline.ends is None:
+            return
+        ends = _current_ends()
+        self._deadline.ends = None if ends is None else max(self._deadline.ends, ends)
+
+
+async def within_deadline(aw: Awaitable[T]) -> T:
+    """Await ``aw``, cancelling it and raising ``DeadlineExceeded`` when the deadline passes.
+
+    The deadline is checked again when the wait times out, so a shared
+    deadline that was extended in the meantime is honoured.
+    """
+    current = _deadline.get()
+    left = None if current is None else current.remaining()
+    if left is None:
+        return await aw
+    if left <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceeded()
+    task = asyncio.ensure_future(aw)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=left)
+            if done:
+                return task.result()
+            left = current.remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Like asyncio.wait_for, let the call finish cancelling before returning.
+            await asyncio.wait({task})
@@ -0,0 +1,110 @@
+"""Hedged requests for calls with a long latency tail.
+
+A ``Hedger`` tracks the latency of the calls it makes. When a call is still
+running after the configured percentile of recent latencies, a duplicate is
+sent and whichever succeeds first is used; the other is cancelled.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, TypeVar
+
+from deadlines import remaining
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latency percentile after which a duplicate request is sent (0 disables hedging).
+HEDGE_PERCENTILE = float(os.getenv("NOTION_HEDGE_PERCENTILE", "0.95"))
+# Calls observed before hedging starts, so the delay is based on real latencies.
+HEDGE_MIN_SAMPLES = int(os.getenv("NOTION_HEDGE_MIN_SAMPLES", "20"))
+# Recent latencies kept per hedger.
+_LATENCY_SAMPLES = 200
+
+# Every hedger created in the process, by name, so their stats can be reported.
+_HEDGERS: Dict[str, "Hedger"] = {}
+
+
+def _observe(task: asyncio.Task) -> None:
+    # Losing requests may fail unobserved; retrieve the error to keep asyncio quiet.
+    if not task.cancelled():
+        task.exception()
+
+
+class Hedger:
+    """Send a duplicate of slow calls and keep the first successful response.
+
+    ``stats`` counts ``calls``, ``hedged`` calls (a duplicate was sent) and
+    ``hedge_wins`` (the duplicate answered first).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_SAMPLES)
+        _HEDGERS[name] = self
+
+    def delay(self) -> float | None:
+        """Seconds to wait before hedging, or ``None`` when calls are not hedged."""
+        if self.percentile <= 0 or len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+
+    async def run(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of ``func()``, calling it a second time if the first call is slow."""
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(func())]
+        tasks[0].add_done_callback(_observe)
+        try:
+            delay = self.delay()
+            left = remaining()
+            if delay is not None and (left is None or left > delay):
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.stats["hedged"] += 1
+                    tasks.append(asyncio.ensure_future(func()))
+                    tasks[1].add_done_callback(_observe)
+
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if t.exception() is None), None)
+                if winner is not None:
+                    break
+                if not pending:
+                    # Every attempt failed; surface the first call's error.
+                    return tasks[0].result()
+
+            if winner is not tasks[0]:
+                self.stats["hedge_wins"] += 1
+            self._latencies.append(time.monotonic() - started)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+def hedge_stats() -> Dict[str, Dict[str, Any]]:
+    """Return counters plus the hedge rate (hedged / calls) and win rate (wins / hedged) per hedger."""
+    return {
+        name: {
+            **h.stats,
+            "hedge_rate": h.stats["hedged"] / h.stats["calls"] if h.stats["calls"] else 0.0,
+            "win_rate": h.stats["hedge_wins"] / h.stats["hedged"] if h.stats["hedged"] else 0.0,
+            "delay": h.delay(),
+        }
+        for name, h in _HEDGERS.items()
+    }
@@ -1,25 +1,38 @@
-from typing import Any, Dict
-from fastapi import FastAPI, UploadFile, File, Body, HTTPException, Depends, Security, Request
+from typing import Any, Dict, List
+from fastapi import FastAPI, UploadFile, File, Body, HTTPException, Depends, Security, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader, HTTPBearer, OAuth2PasswordBearer
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import os
+import math
+import asyncio
+import orjson
+from contextlib import AsyncExitStack, asynccontextmanager
 from dotenv import load_dotenv
-from notion_client import AsyncClient
-from notion_agent import chain
 from notion_tools import (
-    load_tool_data_from_env,
-    load_db_instructions_from_env,
     run_search_agent,
     fetch_page_blocks,
     search_notion_data,
+    SPECULATION_STATS,
+    OPENAI_MODEL,
 )
-from pydantic import BaseModel
+from notion_mirror import NotionMirror
+from tenants import Tenant, TenantRegistry, load_tenant_configs_from_env
+from notion_agent import BATCH_CONCURRENCY
+from admission import AdmissionController, AdmissionRejected, PRIORITY_INTERACTIVE, PRIORITY_SEARCH, PRIORITY_BATCH
+from singleflight import singleflight_stats
+from deadlines import DeadlineExceeded, deadline
+from hedging import hedge_stats
+from profiling import PROFILES, ProfilingMiddleware, get_profile
+from query_cache import QueryCache
+from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
 import logging
 from pathlib import Path
 
@@ -29,12 +42,12 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Load metadata for pages/databases and filter guidance
-TOOL_DATA = load_tool_data_from_env()
-if TOOL_DATA is None:
-    raise ValueError("TOOL_DATA is not set")
+# Tenants by API key; their catalogs are loaded on first use
+TENANT_CONFIGS = load_tenant_configs_from_env()
+if not TENANT_CONFIGS:
+    raise ValueError("No tenants configured; set API_KEY or NOTION_TENANTS_PATH")
+tenants = TenantRegistry(TENANT_CONFIGS)
 FILTER_GUIDE = Path(Path(__file__).resolve().parent, "query_filter_agent_prompt.txt").read_text()
-DB_INSTRUCTIONS = load_db_instructions_from_env()
 
 app = FastAPI()
 
@@ -46,6 +59,10 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler) # typ
 # Add security middleware
 # app.add_middleware(HTTPSRedirectMiddleware)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])  # Configure with your domain in production
+app.add_middleware(GZipMiddleware, minimum_size=1000)  # Only applied when the client sends Accept-Encoding: gzip
+# Requests sending the admin key in X-Profile (or picked by NOTION_PROFILE_SAMPLE_RATE) are profiled
+ADMIN_KEY = os.getenv("NOTION_ADMIN_KEY")
+app.add_middleware(ProfilingMiddleware, token=ADMIN_KEY)
 
 # Configure CORS with specific origins
 app.add_middleware(
@@ -60,15 +77,64 @@ app.add_middleware(
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 async def get_api_key(token: str = Depends(oauth2_scheme)) -> str:
-    if token == os.getenv("API_KEY"):
+    if tenants.config_for(token) is not None:
         return token
     raise HTTPException(
         status_code=401,
         detail="Invalid API Key"
     )
 
-# Initialize Notion client
-notion = AsyncClient(auth=os.getenv("NOTION_TOKEN"))
+async def get_admin_key(token: str = Depends(oauth2_scheme)) -> str:
+    if ADMIN_KEY and token == ADMIN_KEY:
+        return token
+    raise HTTPException(
+        status_code=401,
+        detail="Invalid admin key"
+    )
+
+# Seconds a search may take before it is abandoned with a 504
+SEARCH_DEADLINE = float(os.getenv("NOTION_SEARCH_DEADLINE", "30"))
+
+# Per-API-key concurrency limits and cost budgets. Costs are rough units of
+# upstream work: a search makes several LLM and Notion calls, an add one or two.
+admission = AdmissionController()
+SEARCH_COST = float(os.getenv("NOTION_ADMISSION_SEARCH_COST", "5"))
+ADD_COST = float(os.getenv("NOTION_ADMISSION_ADD_COST", "2"))
+
+@asynccontextmanager
+async def admitted(api_key: str, cost: float, priority: int, slots: int = 1):
+    """Admit a request under the caller's limits and hold their tenant while it runs."""
+    async with AsyncExitStack() as stack:
+        try:
+            await stack.enter_async_context(admission.admit(api_key, cost, priority, slots))
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429 if e.reason == "over_budget" else 503,
+                detail=f"Request not admitted: {e.reason}",
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
+        # The tenant is held for the duration of the request
+        yield await stack.enter_async_context(tenants.acquire(tenants.config_for(api_key)))
+
+def admitted_tenant(cost: float, priority: int):
+    """Dependency that admits the request under the caller's limits and yields their tenant."""
+    async def dependency(api_key: str = Depends(get_api_key)):
+        async with admitted(api_key, cost, priority) as tenant:
+            yield tenant
+    return dependency
+
+def batch_slots(items: int) -> int:
+    """Writes a batch of ``items`` prompts runs at once, each holding an admission slot."""
+    return admission.clamp_slots(min(items, BATCH_CONCURRENCY))
+
+# Optional local SQLite mirror of the catalog databases
+MIRROR_PATH = os.getenv("NOTION_MIRROR_PATH")
+mirror = NotionMirror(MIRROR_PATH) if MIRROR_PATH else None
+
+# Database query results shared by all searches; hot queries are refreshed in the background
+query_cache = QueryCache()
+# Open the LLM and Notion connections at startup instead of on the first request
+WARMUP = os.getenv("NOTION_WARMUP", "true").lower() == "true"
 
 class TextInput(BaseModel):
     text: str
@@ -76,33 +142,86 @@ class TextInput(BaseModel):
 class NotionInput(BaseModel):
     prompt: str
 
+class BatchNotionInput(BaseModel):
+    prompts: List[str] = Field(min_length=1, max_length=int(os.getenv("NOTION_BATCH_MAX_ITEMS", "100")))
+
+async def admitted_batch_tenant(input: BatchNotionInput, api_key: str = Depends(get_api_key)):
+    """Dependency that admits a batch at the cost of all its items and yields the caller's tenant."""
+    async with admitted(api_key, ADD_COST * len(input.prompts), PRIORITY_BATCH, batch_slots(len(input.prompts))) as tenant:
+        yield tenant
+
 class SearchInput(BaseModel):
     query: str
+    # Return the full live text of matched pages instead of indexed snippets
+    fetch_pages: bool = False
+    # Return database rows as column name → list of values
+    columnar: bool = False
+    # Database ID → property names to return (all properties when omitted)
+    properties: Dict[str, List[str]] | None = None
+    # Maximum rows returned per database
+    max_rows: int | None = Field(default=None, ge=1)
+    # Truncate each page's text to this many characters
+    max_page_chars: int | None = Field(default=None, ge=0)
+
+def _json_response(content: Any) -> Response:
+    """Serialize ``content`` with orjson instead of FastAPI's default encoder."""
+    return Response(content=orjson.dumps(content), media_type="application/json")
 
 @app.post("/add-to-notion")
 @limiter.limit("10/minute")
-async def add_to_notion(request: Request, input: NotionInput, api_key: str = Depends(get_api_key)):
+async def add_to_notion(request: Request, input: NotionInput, tenant: Tenant = Depends(admitted_tenant(ADD_COST, PRIORITY_INTERACTIVE))):
     """Process any request to add data to Notion using the agent workflow"""
     state = {
         "messages": [HumanMessage(content=input.prompt)],
     }
 
-    result = await chain.ainvoke(state)
+    result = await tenant.agent.chain.ainvoke(state)
+    query_cache.invalidate(tenant.notion)
     # Return the last message from the result
     return result["messages"][-1].content
 
+@app.post("/add-to-notion/batch")
+@limiter.limit("10/minute")
+async def add_to_notion_batch(
+    request: Request,
+    input: BatchNotionInput,
+    tenant: Tenant = Depends(admitted_batch_tenant),
+):
+    """Add many items to Notion in one call; each item succeeds or fails on its own"""
+    # Never run more writes at once than the admission slots the batch holds
+    results = await tenant.agent.arun_batch(input.prompts, concurrency=batch_slots(len(input.prompts)))
+    query_cache.invalidate(tenant.notion)
+    succeeded = sum(1 for r in results if r["ok"])
+    return {
+        "results": [{"index": i, **r} for i, r in enumerate(results)],
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+    }
+
 @app.post("/search-notion")
 @limiter.limit("10/minute")
-async def search_notion(request: Request, input: SearchInput, api_key: str = Depends(get_api_key)):
+async def search_notion(request: Request, input: SearchInput, tenant: Tenant = Depends(admitted_tenant(SEARCH_COST, PRIORITY_SEARCH))):
     """Run an LLM-powered search against the user's data in Notion."""
-    result = await search_notion_data(
-        input.query,
-        notion,
-        TOOL_DATA,
-        FILTER_GUIDE,
-        DB_INSTRUCTIONS,
-    )
-    return result
+    try:
+        with deadline(SEARCH_DEADLINE):
+            result = await search_notion_data(
+                input.query,
+                tenant.notion,
+                tenant.tool_data,
+                FILTER_GUIDE,
+                tenant.db_instructions,
+                mirror=mirror,
+                query_cache=query_cache,
+                page_index=tenant.page_index,
+                fetch_pages=input.fetch_pages,
+                columnar=input.columnar,
+                properties=input.properties,
+                max_rows=input.max_rows,
+                max_page_chars=input.max_page_chars,
+            )
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Search did not finish before its deadline")
+    return _json_response(result)
 
 @app.get("/health")
 @limiter.limit("30/minute")
@@ -110,12 +229,77 @@ async def health_check(request: Request):
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+@limiter.limit("30/minute")
+async def metrics(request: Request, admin_key: str = Depends(get_admin_key)):
+    """In-process performance counters"""
+    result: Dict[str, Any] = {
+        "singleflight": singleflight_stats(),
+        "speculation": SPECULATION_STATS,
+        "hedging": hedge_stats(),
+        "tenants": {**tenants.stats, "loaded": [t.name for t in tenants.loaded()]},
+        "admission": admission.snapshot(),
+        "query_cache": query_cache.snapshot(),
+    }
+    if mirror is not None:
+        result["mirror"] = mirror.stats
+    return result
+
+@app.get("/admin/profiles")
+@limiter.limit("30/minute")
+async def list_profiles(request: Request, admin_key: str = Depends(get_admin_key)):
+    """Summaries of the most recent request profiles, newest first"""
+    return [p.summary() for p in reversed(PROFILES)]
+
+@app.get("/admin/profiles/{profile_id}")
+@limiter.limit("30/minute")
+async def profile_detail(request: Request, profile_id: str, admin_key: str = Depends(get_admin_key)):
+    """Span trace and stack samples of one profiled request"""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _json_response(profile.to_dict())
+
 @app.get("/openapi.json", include_in_schema=False)
 async def get_openapi_schema():
     """Get the OpenAPI specification"""
     return app.openapi()
 
-# Clean up Notion client on shutdown
+async def warm_connections() -> None:
+    """Load the first tenants and open their Notion and OpenAI connection pools."""
+    for config in list(TENANT_CONFIGS.values())[:tenants.capacity]:
+        try:
+            async with tenants.acquire(config) as tenant:
+                tenant.agent  # compiles the tool graph
+                await tenant.notion.users.me()
+        except Exception as e:
+            logger.warning(f"Could not warm up tenant {config.name}: {e}")
+    try:
+        # Both clients share the process-wide httpx pools used by every ChatOpenAI
+        llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL)
+        await llm.root_async_client.models.retrieve(OPENAI_MODEL)
+        await asyncio.to_thread(llm.root_client.models.retrieve, OPENAI_MODEL)
+    except Exception as e:
+        logger.warning(f"Could not warm up the OpenAI connection: {e}")
+    logger.info("Connection warmup finished")
+
+# Keep the local mirror and the hot queries in sync while the server is running
+@app.on_event("startup")
+async def startup_event():
+    app.state.background_tasks = [asyncio.create_task(query_cache.run_warm_loop())]
+    if mirror is not None:
+        app.state.background_tasks.append(asyncio.create_task(
+            mirror.run_sync_loop(lambda: [(t.notion, t.tool_data) for t in tenants.loaded()])
+        ))
+    if WARMUP:
+        app.state.background_tasks.append(asyncio.create_task(warm_connections()))
+
+# Clean up tenant Notion clients on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
-    await notion.aclose() 
+    for task in app.state.background_tasks:
+        task.cancel()
+    if mirror is not None:
+        mirror.close()
+    await tenants.aclose()
+
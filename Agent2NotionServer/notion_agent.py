@@ -8,20 +8,27 @@ from langchain_core.tools import StructuredTool
 from notion_client import AsyncClient
 import asyncio
 import os
+from collections import defaultdict
+from typing import Any, Dict, List
 from datetime import datetime
 from dotenv import load_dotenv
 from notion_tools import (
     generate_and_cache_tool_metadata,
-    load_tool_data_from_env,
     build_tools_from_data
 )
 import pytz
+from profiling import span
 from logging import getLogger
 
 logger = getLogger(__name__)
 
 load_dotenv()
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5.4")
+# End the run with a templated reply instead of a second LLM turn when every
+# tool call succeeded and the model did not say it has more steps to take.
+FAST_COMPLETION = os.getenv("NOTION_AGENT_FAST_COMPLETION", "true").lower() in ("1", "true", "yes")
+# LLM turns and Notion writes a batch runs at once.
+BATCH_CONCURRENCY = int(os.getenv("NOTION_BATCH_CONCURRENCY", "8"))
 
 set_debug(True)
 set_verbose(True)
@@ -31,67 +38,217 @@ class AgentState(MessagesState):
     pass
 
 
-# Load dynamic tool metadata generated by the preprocessing script
-try:
-    tool_data = load_tool_data_from_env()
-    if not tool_data:
-        raise ValueError("No tool data found")
-except Exception as e:
-    exit(1)
+def continue_plan() -> str:
+    """Call this together with your other tool calls when the request needs more steps after them, e.g. because a later call depends on their results. You will see the results and can make the next calls. Do not call it when these calls complete the request."""
+    return "Make the next calls of your plan now, or reply to the user if nothing is left to do."
 
-dynamic_tools = build_tools_from_data(tool_data)
 
 # Base tools provided by the application
-base_tools = []
+base_tools = [StructuredTool.from_function(continue_plan)]
 
-# Final tool set combines static tools with dynamically generated ones
-tools = base_tools + dynamic_tools
 # Create the prompt
 prompt = ChatPromptTemplate.from_messages([
     (
         "system",
         "You are a helpful assistant that can add data to a user's Notion workspace. "
         "Use the available tools to add data to the correct Notion page or database. "
-        "Choose the appropriate tool based on the user's prompt. Current time is {current_time}."
+        "Choose the appropriate tool based on the user's prompt. If the request takes several rounds of "
+        "tool calls, also call continue_plan in every round but the last. Current time is {current_time}."
     ),
     MessagesPlaceholder(variable_name="messages"),
 ])
 
-# Create the LLM
-llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL)
-llm_with_tools = llm.bind_tools(tools)
-
-def notion_chat(state: AgentState) -> AgentState:
-    """Notion reasoning to create a task"""
-    messages = state["messages"]
-    response = llm_with_tools.invoke(prompt.format_messages(
-        current_time=datetime.now(tz=pytz.timezone('America/Puerto_Rico')).strftime("%Y-%m-%d %H:%M:%S"),
-        messages=messages
-    ))
-
-    return {
-        "messages": [response]
-    }
-
-
-
-# Create the graph
-workflow = StateGraph(AgentState)
-
-# Add nodes
-tool_node = ToolNode(tools=tools)
-workflow.add_node("tools", tool_node)
-workflow.add_node("notion_chat", notion_chat)
-workflow.add_conditional_edges(
-    "notion_chat",
-    tools_condition
-)
-# Any time a tool is called, we return to the chatbot to decide the next step
-workflow.add_edge("tools", "notion_chat")
-workflow.set_entry_point("notion_chat")
-
-workflow.add_edge("notion_chat", END)
-
-# Compile the graph
-chain = workflow.compile()
-
+# Reply templates for the fast-completion path, keyed by the tool's Notion item type.
+_COMPLETION_TEMPLATES = {
+    "database": "Created an entry in {title}.",
+    "page": "Added text to {title}.",
+}
+
+
+def _last_turn(messages: list) -> tuple[AIMessage | None, list[ToolMessage]]:
+    """Return the most recent AI message and the tool results that followed it."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], AIMessage):
+            return messages[i], [m for m in messages[i + 1:] if isinstance(m, ToolMessage)]
+    return None, []
+
+
+def _writes_succeeded(messages: list) -> bool:
+    """Whether the most recent turn that called tools got a successful result for every call."""
+    for i in range(len(messages) - 1, -1, -1):
+        message = messages[i]
+        if isinstance(message, AIMessage) and message.tool_calls:
+            results = [m for m in messages[i + 1:] if isinstance(m, ToolMessage)]
+            return len(results) >= len(message.tool_calls) and all(r.status != "error" for r in results)
+    return False
+
+
+class NotionAgent:
+    """The add-to-notion LangGraph workflow compiled for one tool catalog.
+
+    ``notion`` is the client the tools write with; if omitted they create one
+    from ``NOTION_TOKEN`` per call.
+    """
+
+    def __init__(self, tool_data: List[Dict[str, Any]], notion: AsyncClient | None = None) -> None:
+        if not tool_data:
+            raise ValueError("No tool data found")
+
+        # Final tool set combines static tools with dynamically generated ones
+        self.tools = base_tools + build_tools_from_data(tool_data, notion)
+        self.tools_by_name = {tool.name: tool for tool in self.tools}
+
+        # Create the LLM
+        llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL)
+        self.llm_with_tools = llm.bind_tools(self.tools)
+
+        self.tool_node = ToolNode(tools=self.tools)
+        self.chain = self._build_graph()
+
+    def notion_chat(self, state: AgentState) -> AgentState:
+        """Notion reasoning to create a task"""
+        messages = state["messages"]
+        with span("llm.notion_chat"):
+            response = self.llm_with_tools.invoke(prompt.format_messages(
+                current_time=datetime.now(tz=pytz.timezone('America/Puerto_Rico')).strftime("%Y-%m-%d %H:%M:%S"),
+                messages=messages
+            ))
+
+        return {
+            "messages": [response]
+        }
+
+    def after_tools(self, state: AgentState) -> str:
+        """Route to the templated reply when the last tool turn needs no more reasoning.
+
+        A second ``notion_chat`` turn is only needed when a tool failed (so the model
+        can retry or explain) or the model called ``continue_plan`` because the
+        results feed the next step of a multi-step plan.
+        """
+        if not FAST_COMPLETION:
+            return "notion_chat"
+        ai_message, results = _last_turn(state["messages"])
+        if ai_message is None or not results or len(results) < len(ai_message.tool_calls):
+            return "notion_chat"
+        for result in results:
+            if result.status == "error" or result.name not in self.tools_by_name or result.name == continue_plan.__name__:
+                return "notion_chat"
+        return "fast_complete"
+
+    def fast_complete(self, state: AgentState) -> AgentState:
+        """Finish the run with a reply built from the tool results, without calling the LLM."""
+        _, results = _last_turn(state["messages"])
+        lines = []
+        for result in results:
+            metadata = self.tools_by_name[result.name or ""].metadata or {}
+            template = _COMPLETION_TEMPLATES.get(metadata.get("notion_type", ""))
+            lines.append(template.format(title=metadata.get("notion_title")) if template else str(result.content))
+        return {
+            "messages": [AIMessage(content=" ".join(lines))]
+        }
+
+    def _build_graph(self):
+        # Create the graph
+        workflow = StateGraph(AgentState)
+
+        # Add nodes
+        workflow.add_node("tools", self.tool_node)
+        workflow.add_node("notion_chat", self.notion_chat)
+        workflow.add_node("fast_complete", self.fast_complete)
+        workflow.add_conditional_edges(
+            "notion_chat",
+            tools_condition
+        )
+        # After a tool call we return to the chatbot to decide the next step, unless
+        # the fast-completion path can answer directly
+        workflow.add_conditional_edges(
+            "tools",
+            self.after_tools,
+            {"notion_chat": "notion_chat", "fast_complete": "fast_complete"},
+        )
+        workflow.add_edge("fast_complete", END)
+        workflow.set_entry_point("notion_chat")
+
+        workflow.add_edge("notion_chat", END)
+
+        # Compile the graph
+        return workflow.compile()
+
+    async def arun_batch(self, prompts: List[str], concurrency: int = BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+        """Run many add-to-notion prompts, writing their results concurrently.
+
+        Every prompt's first LLM turn runs concurrently, and so do the
+        resulting tool calls, e.g. the rows created in one database. Only
+        appends to the same page run one after another, in prompt order, so
+        the text keeps its order. Items whose writes
+        need more reasoning continue through the graph; the rest finish with
+        the fast-completion reply. At most ``concurrency`` LLM turns or Notion
+        writes are in flight at once.
+
+        Returns one ``{"ok", "result", "error", "targets"}`` dict per prompt;
+        a failing item does not affect the others.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def plan(text: str) -> List[Any]:
+            messages = [HumanMessage(content=text)]
+            async with semaphore:
+                response = await asyncio.to_thread(self.notion_chat, {"messages": messages})
+            return messages + response["messages"]
+
+        planned = await asyncio.gather(*(plan(p) for p in prompts), return_exceptions=True)
+
+        async def write(i: int, call: dict) -> None:
+            async with semaphore:
+                result = await self.tool_node.ainvoke({"messages": [AIMessage(content="", tool_calls=[call])]})
+            planned[i].extend(result["messages"])
+
+        async def append_in_order(calls: List[tuple[int, dict]]) -> None:
+            for i, call in calls:
+                await write(i, call)
+
+        writes = []
+        appends: Dict[str, List[tuple[int, dict]]] = defaultdict(list)
+        for i, messages in enumerate(planned):
+            if isinstance(messages, BaseException):
+                continue
+            for call in messages[-1].tool_calls:
+                tool = self.tools_by_name.get(call["name"])
+                metadata = (tool.metadata if tool else None) or {}
+                if metadata.get("notion_type") == "page":
+                    appends[metadata["notion_id"]].append((i, call))
+                else:
+                    writes.append(write(i, call))
+        writes.extend(append_in_order(calls) for calls in appends.values())
+
+        for error in await asyncio.gather(*writes, return_exceptions=True):
+            if error is not None:
+                logger.error("Batch write failed: %s", error)
+
+        async def finish(messages: Any) -> Dict[str, Any]:
+            if isinstance(messages, BaseException):
+                return {"ok": False, "result": None, "error": str(messages), "targets": []}
+            ai_message = next(m for m in messages if isinstance(m, AIMessage))
+            targets = []
+            for call in ai_message.tool_calls:
+                tool = self.tools_by_name.get(call["name"])
+                if tool is not None and tool.metadata:
+                    targets.append(tool.metadata["notion_title"])
+            state = {"messages": messages}
+            try:
+                if ai_message.tool_calls and self.after_tools(state) == "fast_complete":
+                    messages = messages + self.fast_complete(state)["messages"]
+                elif ai_message.tool_calls:
+                    async with semaphore:
+                        messages = (await self.chain.ainvoke(state))["messages"]
+            except Exception as e:
+                return {"ok": False, "result": None, "error": str(e), "targets": targets}
+            ok = _writes_succeeded(messages)
+            return {
+                "ok": ok,
+                "result": messages[-1].content,
+                "error": None if ok else "No entry was written",
+                "targets": targets,
+            }
+
+        return list(await asyncio.gather(*(finish(m) for m in planned)))
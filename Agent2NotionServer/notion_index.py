@@ -0,0 +1,257 @@
+"""Inverted full-text index over the block text of catalog pages.
+
+The index is built while the tool metadata is refreshed and persisted next to
+it, so ``/search-notion`` can answer page-level searches with ranked snippets
+instead of downloading every selected page's blocks from Notion. The refresh
+builds it on disk with ``PageIndexWriter``; the server loads it as a
+``PageIndex``.
+"""
+import os
+import re
+import json
+import math
+import sqlite3
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+
+import boto3
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+PAGE_INDEX_KEY = os.getenv("NOTION_PAGE_INDEX_KEY", "notion_page_index.json")
+SNIPPETS_PER_PAGE = int(os.getenv("NOTION_INDEX_SNIPPETS_PER_PAGE", "3"))
+SNIPPET_CHARS = int(os.getenv("NOTION_INDEX_SNIPPET_CHARS", "300"))
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _block_text(block: dict) -> str:
+    typ = block.get("type")
+    if not typ:
+        return ""
+    rich = block.get(typ, {}).get("rich_text", [])
+    return "".join(rt.get("plain_text", "") for rt in rich or [])
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _block_texts(blocks: List[dict]) -> List[str]:
+    return [t for t in (_block_text(b) for b in blocks) if t]
+
+
+def _postings(texts: List[str]) -> Iterator[Tuple[str, int, int]]:
+    """Yield ``(token, block_no, char_offset)`` for every token of a page's block texts."""
+    for block_no, text in enumerate(texts):
+        for match in _TOKEN_RE.finditer(text.lower()):
+            yield match.group(), block_no, match.start()
+
+
+class PageIndex:
+    """Token → block postings for a set of pages.
+
+    ``postings`` maps each token to ``[page_no, block_no, char_offset]``
+    triples, where ``page_no`` indexes ``page_ids`` and ``block_no`` indexes
+    the page's list of block texts in ``blocks``.
+    """
+
+    def __init__(
+        self,
+        page_ids: List[str] | None = None,
+        blocks: List[List[str]] | None = None,
+        postings: Dict[str, List[List[int]]] | None = None,
+    ) -> None:
+        self.page_ids: List[str] = page_ids or []
+        self.blocks: List[List[str]] = blocks or []
+        self.postings: Dict[str, List[List[int]]] = defaultdict(list, postings or {})
+        self._page_no = {pid: n for n, pid in enumerate(self.page_ids)}
+
+    def __contains__(self, page_id: str) -> bool:
+        return page_id in self._page_no
+
+    def add_page(self, page_id: str, blocks: List[dict]) -> None:
+        """Index the text of ``blocks`` (raw Notion block objects) for ``page_id``."""
+        page_no = len(self.page_ids)
+        self.page_ids.append(page_id)
+        self._page_no[page_id] = page_no
+        texts = _block_texts(blocks)
+        self.blocks.append(texts)
+        for token, block_no, offset in _postings(texts):
+            self.postings[token].append([page_no, block_no, offset])
+
+    def _snippet(self, text: str, offset: int) -> str:
+        if len(text) <= SNIPPET_CHARS:
+            return text
+        start = max(0, min(offset - SNIPPET_CHARS // 3, len(text) - SNIPPET_CHARS))
+        snippet = text[start:start + SNIPPET_CHARS]
+        return ("…" if start > 0 else "") + snippet + ("…" if start + SNIPPET_CHARS < len(text) else "")
+
+    def search(self, query: str, page_ids: List[str] | None = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Return ranked snippets for ``query``.
+
+        Blocks are scored with a sublinear TF-IDF sum over the query tokens
+        and pages are ordered by their best block. Each page maps to at most
+        ``NOTION_INDEX_SNIPPETS_PER_PAGE`` snippets of the form
+        ``{"block": <block_no>, "score": <float>, "text": <snippet>}``.
+        Pages in ``page_ids`` with no matching block fall back to their lead
+        block so that every selected page is represented.
+        """
+        allowed = None if page_ids is None else {self._page_no[p] for p in page_ids if p in self._page_no}
+        total_blocks = sum(len(b) for b in self.blocks) or 1
+
+        scores: Dict[tuple, float] = defaultdict(float)
+        first_offset: Dict[tuple, int] = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            term_freq: Dict[tuple, int] = defaultdict(int)
+            for page_no, block_no, offset in postings:
+                if allowed is None or page_no in allowed:
+                    term_freq[(page_no, block_no)] += 1
+                    first_offset.setdefault((page_no, block_no), offset)
+            doc_freq = len({(p, b) for p, b, _ in postings})
+            idf = math.log(1 + total_blocks / doc_freq)
+            for key, tf in term_freq.items():
+                scores[key] += (1 + math.log(tf)) * idf
+
+        by_page: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for (page_no, block_no), score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+            if len(by_page[page_no]) < SNIPPETS_PER_PAGE:
+                text = self.blocks[page_no][block_no]
+                by_page[page_no].append({
+                    "block": block_no,
+                    "score": round(score, 4),
+                    "text": self._snippet(text, first_offset[(page_no, block_no)]),
+                })
+
+        results = {self.page_ids[n]: snippets for n, snippets in by_page.items()}
+        for page_no in sorted(allowed or ()):
+            if page_no not in by_page and self.blocks[page_no]:
+                results[self.page_ids[page_no]] = [
+                    {"block": 0, "score": 0.0, "text": self._snippet(self.blocks[page_no][0], 0)}
+                ]
+        return results
+
+    def to_json(self) -> str:
+        return json.dumps({"page_ids": self.page_ids, "blocks": self.blocks, "postings": self.postings})
+
+    @classmethod
+    def from_json(cls, data: str) -> "PageIndex":
+        raw = json.loads(data)
+        return cls(raw["page_ids"], raw["blocks"], raw["postings"])
+
+
+class PageIndexWriter:
+    """Build a page index on disk, one page at a time.
+
+    It has the same ``add_page`` as ``PageIndex``, but block texts and
+    postings go to a temporary SQLite database instead of memory, so
+    indexing a large workspace does not hold the whole index. ``write``
+    streams the result out in the ``PageIndex.to_json`` format.
+    """
+
+    def __init__(self) -> None:
+        # An empty filename gives a private temporary database that SQLite
+        # keeps on disk once it outgrows its page cache.
+        self._conn = sqlite3.connect("")
+        self._conn.executescript(
+            "CREATE TABLE pages (page_no INTEGER PRIMARY KEY, page_id TEXT);"
+            "CREATE TABLE blocks (page_no INTEGER, block_no INTEGER, text TEXT, PRIMARY KEY (page_no, block_no));"
+            "CREATE TABLE postings (token TEXT, page_no INTEGER, block_no INTEGER, char_offset INTEGER);"
+        )
+        self.pages = 0
+
+    def add_page(self, page_id: str, blocks: List[dict]) -> None:
+        """Index the text of ``blocks`` (raw Notion block objects) for ``page_id``."""
+        page_no = self.pages
+        self.pages += 1
+        texts = _block_texts(blocks)
+        with self._conn:
+            self._conn.execute("INSERT INTO pages VALUES (?, ?)", (page_no, page_id))
+            self._conn.executemany(
+                "INSERT INTO blocks VALUES (?, ?, ?)",
+                ((page_no, block_no, text) for block_no, text in enumerate(texts)),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                ((token, page_no, block_no, offset) for token, block_no, offset in _postings(texts)),
+            )
+
+    def write(self, f: TextIO) -> None:
+        """Write the index to ``f`` as JSON, holding at most one page's texts at a time."""
+        f.write('{"page_ids": [')
+        for n, (page_id,) in enumerate(self._conn.execute("SELECT page_id FROM pages ORDER BY page_no")):
+            f.write(("," if n else "") + json.dumps(page_id))
+
+        f.write('], "blocks": [')
+        rows = self._conn.execute("SELECT page_no, text FROM blocks ORDER BY page_no, block_no")
+        row = next(rows, None)
+        for page_no in range(self.pages):
+            texts = []
+            while row is not None and row[0] == page_no:
+                texts.append(row[1])
+                row = next(rows, None)
+            f.write(("," if page_no else "") + json.dumps(texts))
+
+        f.write('], "postings": {')
+        token = None
+        for current, page_no, block_no, offset in self._conn.execute(
+            "SELECT token, page_no, block_no, char_offset FROM postings ORDER BY token, page_no, block_no, char_offset"
+        ):
+            if current == token:
+                f.write(",")
+            else:
+                f.write(("], " if token is not None else "") + json.dumps(current) + ": [")
+                token = current
+            f.write(f"[{page_no}, {block_no}, {offset}]")
+        if token is not None:
+            f.write("]")
+        f.write("}}")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def load_page_index(path: str | None, key: str | None = None) -> PageIndex | None:
+    """Load the page index from S3 or a local override.
+
+    Parameters
+    ----------
+    path : str | None
+        Optional local file path. If ``None`` the index is loaded from the S3
+        bucket specified by ``NOTION_TOOL_DATA_BUCKET`` (default
+        ``notionserver``) using the key given by ``NOTION_PAGE_INDEX_KEY``
+        (default ``notion_page_index.json``).
+    key : str | None
+        Optional S3 key overriding ``NOTION_PAGE_INDEX_KEY``.
+
+    Returns
+    -------
+    PageIndex | None
+        The index, or ``None`` if none has been generated yet, in which case
+        page contents are fetched live.
+    """
+    if path is not None:
+        with open(path, "r") as f:
+            return PageIndex.from_json(f.read())
+
+    bucket = os.getenv("NOTION_TOOL_DATA_BUCKET", "notionserver")
+    key = key or PAGE_INDEX_KEY
+    s3 = boto3.client("s3")
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        logger.info("Loaded page index from s3://%s/%s", bucket, key)
+        return PageIndex.from_json(obj["Body"].read().decode("utf-8"))
+    except Exception as e:  # pragma: no cover - network errors
+        logger.info(
+            "Failed to load page index from s3://%s/%s: %s", bucket, key, e
+        )
+        local_path = os.path.join(os.path.dirname(__file__), key)
+        if not os.path.exists(local_path):
+            return None
+        with open(local_path, "r") as f:
+            return PageIndex.from_json(f.read())
+
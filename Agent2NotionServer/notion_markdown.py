@@ -0,0 +1,212 @@
+"""Convert markdown or plain text to Notion blocks and append them in bulk.
+
+The converter works line by line and yields blocks as soon as they are
+complete, splitting text at Notion's limits (2000 characters per rich text
+object, 100 rich text objects per block). ``append_blocks`` sends them in as
+few ``blocks.children.append`` calls as the 100-children and request size
+limits allow.
+"""
+import re
+import json
+import asyncio
+from typing import Any, Dict, Iterable, Iterator, List
+
+from notion_client import AsyncClient
+
+from profiling import span
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+# Notion API limits
+MAX_TEXT_CHARS = 2000
+MAX_RICH_TEXT_ITEMS = 100
+MAX_CHILDREN = 100
+# Keep each append request well below Notion's 500KB payload limit, counted
+# in the UTF-8 encoded JSON that is actually sent.
+MAX_REQUEST_BYTES = 400_000
+
+# Languages accepted by Notion code blocks for the fence names people usually write.
+_CODE_LANGUAGES = {
+    "bash": "bash", "sh": "shell", "shell": "shell", "c": "c", "cpp": "c++", "c++": "c++", "csharp": "c#",
+    "css": "css", "diff": "diff", "go": "go", "html": "html", "java": "java", "js": "javascript",
+    "javascript": "javascript", "json": "json", "kotlin": "kotlin", "markdown": "markdown", "md": "markdown",
+    "php": "php", "py": "python", "python": "python", "ruby": "ruby", "rust": "rust", "sql": "sql",
+    "swift": "swift", "ts": "typescript", "typescript": "typescript", "yaml": "yaml", "yml": "yaml",
+}
+
+_HEADING_RE = re.compile(r"^(#{1,3})\s+(.*)$")
+_TODO_RE = re.compile(r"^\s*[-*+]\s+\[([ xX])\]\s+(.*)$")
+_BULLET_RE = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED_RE = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_QUOTE_RE = re.compile(r"^>\s?(.*)$")
+_DIVIDER_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_FENCE_RE = re.compile(r"^\s*```\s*([\w+#-]*)\s*$")
+_INLINE_RE = re.compile(
+    r"\*\*(?P<bold>.+?)\*\*"
+    r"|`(?P<code>[^`]+)`"
+    # Notion rejects relative or otherwise invalid link URLs, so only absolute ones become links.
+    r"|\[(?P<link>[^\]]+)\]\((?P<url>(?:https?://|mailto:)[^)\s]+)\)"
+    r"|(?<![\w*])\*(?P<italic>[^*\s][^*]*?)\*(?![\w*])"
+)
+
+
+def _text(content: str, link: str | None = None, **annotations: bool) -> Dict[str, Any]:
+    item: Dict[str, Any] = {"type": "text", "text": {"content": content, "link": {"url": link} if link else None}}
+    if annotations:
+        item["annotations"] = annotations
+    return item
+
+
+def rich_text(text: str, inline: bool = True) -> List[Dict[str, Any]]:
+    """Split ``text`` into rich text objects of at most ``MAX_TEXT_CHARS`` characters.
+
+    With ``inline`` the markdown markers for bold, italic, inline code and
+    links are turned into annotations.
+    """
+    items: List[Dict[str, Any]] = []
+    if inline:
+        pos = 0
+        for match in _INLINE_RE.finditer(text):
+            if match.start() > pos:
+                items.append(_text(text[pos:match.start()]))
+            if match.group("bold") is not None:
+                items.append(_text(match.group("bold"), bold=True))
+            elif match.group("code") is not None:
+                items.append(_text(match.group("code"), code=True))
+            elif match.group("link") is not None:
+                items.append(_text(match.group("link"), link=match.group("url")))
+            else:
+                items.append(_text(match.group("italic"), italic=True))
+            pos = match.end()
+        if pos < len(text):
+            items.append(_text(text[pos:]))
+    elif text:
+        items.append(_text(text))
+
+    split: List[Dict[str, Any]] = []
+    for item in items:
+        content = item["text"]["content"]
+        if len(content) <= MAX_TEXT_CHARS:
+            split.append(item)
+            continue
+        for start in range(0, len(content), MAX_TEXT_CHARS):
+            split.append({**item, "text": {**item["text"], "content": content[start:start + MAX_TEXT_CHARS]}})
+    return split
+
+
+def _blocks(block_type: str, text: str, inline: bool = True, **extra: Any) -> Iterator[Dict[str, Any]]:
+    """Yield one block of ``block_type``, or several if the text needs more than 100 rich text objects."""
+    items = rich_text(text, inline)
+    for start in range(0, max(len(items), 1), MAX_RICH_TEXT_ITEMS):
+        yield {
+            "object": "block",
+            "type": block_type,
+            block_type: {"rich_text": items[start:start + MAX_RICH_TEXT_ITEMS], **extra},
+        }
+
+
+def markdown_to_blocks(source: str | Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield Notion blocks for markdown ``source`` (a string or an iterable of lines).
+
+    Headings (``#`` to ``###``), bulleted, numbered and to-do list items,
+    quotes, dividers and fenced code blocks are recognised; any other run of
+    non-blank lines becomes one paragraph, so plain text keeps its paragraphs.
+    Nested list indentation is flattened.
+    """
+    lines = source.splitlines() if isinstance(source, str) else source
+    paragraph: List[str] = []
+    code: List[str] | None = None
+    language = "plain text"
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if code is not None:
+            if _FENCE_RE.match(line):
+                yield from _blocks("code", "\n".join(code), inline=False, language=language)
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        fence = _FENCE_RE.match(line)
+        if not line.strip() or fence or _HEADING_RE.match(line) or _BULLET_RE.match(line) \
+                or _NUMBERED_RE.match(line) or _QUOTE_RE.match(line) or _DIVIDER_RE.match(line):
+            if paragraph:
+                yield from _blocks("paragraph", "\n".join(paragraph))
+                paragraph = []
+        else:
+            paragraph.append(line)
+            continue
+
+        if fence:
+            code, language = [], _CODE_LANGUAGES.get(fence.group(1).lower(), "plain text")
+        elif _DIVIDER_RE.match(line):
+            yield {"object": "block", "type": "divider", "divider": {}}
+        elif heading := _HEADING_RE.match(line):
+            yield from _blocks(f"heading_{len(heading.group(1))}", heading.group(2))
+        elif todo := _TODO_RE.match(line):
+            yield from _blocks("to_do", todo.group(2), checked=todo.group(1) != " ")
+        elif bullet := _BULLET_RE.match(line):
+            yield from _blocks("bulleted_list_item", bullet.group(1))
+        elif numbered := _NUMBERED_RE.match(line):
+            yield from _blocks("numbered_list_item", numbered.group(1))
+        elif quote := _QUOTE_RE.match(line):
+            yield from _blocks("quote", quote.group(1))
+
+    if code is not None:
+        # Unterminated fence: keep the text as code rather than dropping it.
+        yield from _blocks("code", "\n".join(code), inline=False, language=language)
+    if paragraph:
+        yield from _blocks("paragraph", "\n".join(paragraph))
+
+
+def _block_bytes(block: Dict[str, Any]) -> int:
+    """Size of ``block`` in a request body, including its JSON structure (CJK text takes 3 bytes a character)."""
+    return len(json.dumps(block, ensure_ascii=False).encode("utf-8")) + 2
+
+
+def chunk_blocks(blocks: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """Group ``blocks`` into append-sized lists of at most ``MAX_CHILDREN`` blocks and ``MAX_REQUEST_BYTES``."""
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for block in blocks:
+        block_size = _block_bytes(block)
+        if chunk and (len(chunk) == MAX_CHILDREN or size + block_size > MAX_REQUEST_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(block)
+        size += block_size
+    if chunk:
+        yield chunk
+
+
+async def _append(notion: AsyncClient, block_id: str, chunk: List[Dict[str, Any]]) -> None:
+    with span("notion.blocks.children.append", block_id=block_id, blocks=len(chunk)):
+        await notion.blocks.children.append(block_id=block_id, children=chunk)
+
+
+async def append_blocks(notion: AsyncClient, block_id: str, blocks: Iterable[Dict[str, Any]]) -> int:
+    """Append ``blocks`` to ``block_id`` in order and return the number of API calls made.
+
+    Appends to one parent have to be sequential to keep their order. Each
+    request is started before the next chunk is built, so building the next
+    chunk overlaps with waiting for the previous response.
+    """
+    pending: asyncio.Future | None = None
+    calls = 0
+    try:
+        for chunk in chunk_blocks(blocks):
+            if pending is not None:
+                await pending
+            pending = asyncio.ensure_future(_append(notion, block_id, chunk))
+            calls += 1
+            # Let the request go out before the loop builds the next chunk.
+            await asyncio.sleep(0)
+        if pending is not None:
+            await pending
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+    logger.info("Appended blocks to %s in %d call(s)", block_id, calls)
+    return calls
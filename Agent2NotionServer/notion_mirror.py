@@ -0,0 +1,480 @@
+"""Local SQLite mirror of the Notion databases listed in the tool catalog.
+
+Each database is stored in its own table with one typed column per schema
+property, plus the simplified row (the same shape ``_simplify_database_query``
+returns) so that reads never have to touch the Notion API. The mirror is kept
+up to date incrementally using ``last_edited_time`` and periodically re-synced
+in full so that rows deleted or archived in Notion disappear locally as well.
+
+Filter objects produced by ``build_db_filter`` are translated into SQL by
+``filter_to_sql``. Anything that cannot be translated (formula/rollup filters,
+relative dates other than past/next week/month/year, ...) raises
+``UnsupportedFilterError`` and callers fall back to querying Notion live.
+"""
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Tuple, Callable, Iterable
+
+from notion_client import AsyncClient
+
+from notion_tools import _extract_property_value
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+MIRROR_MAX_STALENESS = float(os.getenv("NOTION_MIRROR_MAX_STALENESS", "300"))
+MIRROR_SYNC_INTERVAL = float(os.getenv("NOTION_MIRROR_SYNC_INTERVAL", "60"))
+MIRROR_FULL_SYNC_INTERVAL = float(os.getenv("NOTION_MIRROR_FULL_SYNC_INTERVAL", "3600"))
+# Largest page of results one databases.query returns.
+PAGE_SIZE = 100
+
+# Notion property type → SQLite column affinity. Types not listed here are
+# stored as JSON text and cannot be filtered locally.
+_COLUMN_TYPES = {
+    "title": "TEXT",
+    "rich_text": "TEXT",
+    "url": "TEXT",
+    "email": "TEXT",
+    "phone_number": "TEXT",
+    "select": "TEXT",
+    "status": "TEXT",
+    "number": "REAL",
+    "checkbox": "INTEGER",
+    "date": "TEXT",
+    "created_time": "TEXT",
+    "last_edited_time": "TEXT",
+    "multi_select": "TEXT",
+    "people": "TEXT",
+    "relation": "TEXT",
+}
+
+_TEXT_TYPES = {"title", "rich_text", "url", "email", "phone_number"}
+_OPTION_TYPES = {"select", "status"}
+_LIST_TYPES = {"multi_select", "people", "relation"}
+_DATE_TYPES = {"date", "created_time", "last_edited_time"}
+
+_NUMBER_OPS = {
+    "equals": "=",
+    "greater_than": ">",
+    "less_than": "<",
+    "greater_than_or_equal_to": ">=",
+    "less_than_or_equal_to": "<=",
+}
+
+_DATE_OPS = {
+    "equals": "=",
+    "before": "<",
+    "after": ">",
+    "on_or_before": "<=",
+    "on_or_after": ">=",
+}
+
+_RELATIVE_DATE_OPS = {
+    "past_week": -7,
+    "past_month": -30,
+    "past_year": -365,
+    "next_week": 7,
+    "next_month": 30,
+    "next_year": 365,
+}
+
+
+class UnsupportedFilterError(ValueError):
+    """Raised when a Notion filter object cannot be translated into SQL."""
+
+
+def _quote(identifier: str) -> str:
+    """Quote an SQLite identifier (property names may contain any character)."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _table_name(database_id: str) -> str:
+    return "db_" + database_id.replace("-", "")
+
+
+def _normalize_date(value: str | None) -> str | None:
+    """Return ``value`` as an ISO string that compares correctly as text.
+
+    Date-only values are kept as ``YYYY-MM-DD``; datetimes are converted to UTC
+    so that values written with different offsets remain comparable.
+    """
+    if not value:
+        return None
+    if len(value) == 10:
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def _schema_hash(properties: Dict[str, Any]) -> str:
+    return hashlib.sha1(
+        json.dumps({name: info.get("type") for name, info in properties.items()}, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def schema_columns(properties: Dict[str, Any]) -> Dict[str, Tuple[str, str]]:
+    """Map every property name *and* id to ``(column name, property type)``."""
+    columns: Dict[str, Tuple[str, str]] = {}
+    for name, info in properties.items():
+        entry = (name, info.get("type", ""))
+        columns[name] = entry
+        if info.get("id"):
+            columns.setdefault(info["id"], entry)
+    return columns
+
+
+def _column_value(prop: dict) -> Any:
+    """Convert a raw Notion property object into the value stored in its column."""
+    typ = prop.get("type")
+    match typ:
+        case "date":
+            date = prop.get("date")
+            return _normalize_date(date.get("start")) if date else None
+        case "created_time" | "last_edited_time":
+            return _normalize_date(prop.get(typ))
+        case "checkbox":
+            return int(bool(prop.get("checkbox")))
+        case "people" | "relation":
+            return json.dumps([item.get("id") for item in prop.get(typ) or []])
+    value = _extract_property_value(prop)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _date_condition(column: str, ops: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    if not isinstance(ops, dict) or len(ops) != 1:
+        raise UnsupportedFilterError("Expected a single operator for date filter")
+    (op, value), = ops.items()
+    if op == "is_empty":
+        return f"{column} IS NULL", []
+    if op == "is_not_empty":
+        return f"{column} IS NOT NULL", []
+    if op in _RELATIVE_DATE_OPS:
+        today = datetime.now(tz=timezone.utc).date()
+        bound = today + timedelta(days=_RELATIVE_DATE_OPS[op])
+        low, high = sorted([today.isoformat(), bound.isoformat()])
+        return f"substr({column}, 1, 10) BETWEEN ? AND ?", [low, high]
+    if op not in _DATE_OPS or not isinstance(value, str):
+        raise UnsupportedFilterError(f"Unsupported date operator: {op}")
+    normalized = _normalize_date(value)
+    if len(value) == 10:
+        return f"substr({column}, 1, 10) {_DATE_OPS[op]} ?", [normalized]
+    return f"{column} {_DATE_OPS[op]} ?", [normalized]
+
+
+def _property_condition(column: str, typ: str, ops: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    if not isinstance(ops, dict) or len(ops) != 1:
+        raise UnsupportedFilterError(f"Expected a single operator for {typ} filter")
+    (op, value), = ops.items()
+
+    if typ in _DATE_TYPES:
+        return _date_condition(column, ops)
+
+    if op == "is_empty":
+        if typ in _LIST_TYPES:
+            return f"({column} IS NULL OR {column} = '[]')", []
+        return f"({column} IS NULL OR {column} = '')", []
+    if op == "is_not_empty":
+        if typ in _LIST_TYPES:
+            return f"({column} IS NOT NULL AND {column} != '[]')", []
+        return f"({column} IS NOT NULL AND {column} != '')", []
+
+    if typ in _TEXT_TYPES:
+        match op:
+            case "equals":
+                return f"{column} = ?", [value]
+            case "does_not_equal":
+                return f"({column} IS NULL OR {column} != ?)", [value]
+            case "contains":
+                return f"{column} LIKE ? ESCAPE '\\'", [f"%{_like_escape(value)}%"]
+            case "does_not_contain":
+                return f"({column} IS NULL OR {column} NOT LIKE ? ESCAPE '\\')", [f"%{_like_escape(value)}%"]
+            case "starts_with":
+                return f"{column} LIKE ? ESCAPE '\\'", [f"{_like_escape(value)}%"]
+            case "ends_with":
+                return f"{column} LIKE ? ESCAPE '\\'", [f"%{_like_escape(value)}"]
+    elif typ in _OPTION_TYPES:
+        match op:
+            case "equals":
+                return f"{column} = ?", [value]
+            case "does_not_equal":
+                return f"({column} IS NULL OR {column} != ?)", [value]
+    elif typ == "number":
+        if op in _NUMBER_OPS:
+            return f"{column} {_NUMBER_OPS[op]} ?", [value]
+        if op == "does_not_equal":
+            return f"({column} IS NULL OR {column} != ?)", [value]
+    elif typ == "checkbox":
+        match op:
+            case "equals":
+                return f"{column} = ?", [int(bool(value))]
+            case "does_not_equal":
+                return f"{column} != ?", [int(bool(value))]
+    elif typ in _LIST_TYPES:
+        match op:
+            case "contains":
+                return f"EXISTS (SELECT 1 FROM json_each({column}) WHERE value = ?)", [value]
+            case "does_not_contain":
+                return f"NOT EXISTS (SELECT 1 FROM json_each({column}) WHERE value = ?)", [value]
+
+    raise UnsupportedFilterError(f"Unsupported operator {op!r} for {typ} property")
+
+
+def filter_to_sql(filter_obj: Dict[str, Any] | None, columns: Dict[str, Tuple[str, str]]) -> Tuple[str, List[Any]]:
+    """Translate a Notion database filter object into an SQL ``WHERE`` clause.
+
+    Parameters
+    ----------
+    filter_obj : Dict[str, Any] | None
+        Filter in the Notion API format (single condition or nested
+        ``and``/``or`` compound). ``None`` or ``{}`` matches every row.
+    columns : Dict[str, Tuple[str, str]]
+        Output of ``schema_columns`` for the database being queried.
+
+    Returns
+    -------
+    Tuple[str, List[Any]]
+        The SQL expression and its positional parameters.
+
+    Raises
+    ------
+    UnsupportedFilterError
+        If any part of the filter has no local equivalent.
+    """
+    if not filter_obj:
+        return "1", []
+
+    for compound in ("and", "or"):
+        if compound in filter_obj:
+            parts = [filter_to_sql(sub, columns) for sub in filter_obj[compound]]
+            if not parts:
+                return "1", []
+            sql = f" {compound.upper()} ".join(f"({p[0]})" for p in parts)
+            return sql, [param for p in parts for param in p[1]]
+
+    if "timestamp" in filter_obj:
+        typ = filter_obj["timestamp"]
+        if typ not in ("created_time", "last_edited_time"):
+            raise UnsupportedFilterError(f"Unsupported timestamp filter: {typ}")
+        return _date_condition(_quote("_" + typ), filter_obj.get(typ, {}))
+
+    prop = filter_obj.get("property")
+    if prop not in columns:
+        raise UnsupportedFilterError(f"Unknown property: {prop}")
+    column, typ = columns[prop]
+    if typ not in _COLUMN_TYPES:
+        raise UnsupportedFilterError(f"Unsupported property type: {typ}")
+    ops = filter_obj.get(typ)
+    if ops is None:
+        raise UnsupportedFilterError(f"Filter for {prop!r} does not match its type {typ}")
+    return _property_condition(_quote(column), typ, ops)
+
+
+class NotionMirror:
+    """SQLite-backed copy of Notion databases that can answer filtered queries."""
+
+    def __init__(
+        self,
+        path: str,
+        max_staleness: float = MIRROR_MAX_STALENESS,
+        full_sync_interval: float = MIRROR_FULL_SYNC_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.max_staleness = max_staleness
+        self.full_sync_interval = full_sync_interval
+        self.stats = {"local_hits": 0, "stale": 0, "unsupported": 0}
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _mirror_meta ("
+            "database_id TEXT PRIMARY KEY, schema_hash TEXT, "
+            "last_synced REAL, last_full_sync REAL, cursor TEXT)"
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _meta(self, database_id: str) -> Tuple[str, float, float, str | None] | None:
+        return self._conn.execute(
+            "SELECT schema_hash, last_synced, last_full_sync, cursor FROM _mirror_meta WHERE database_id = ?",
+            (database_id,),
+        ).fetchone()
+
+    def _create_table(self, database_id: str, properties: Dict[str, Any]) -> None:
+        table = _quote(_table_name(database_id))
+        cols = ", ".join(
+            f"{_quote(name)} {_COLUMN_TYPES.get(info.get('type'), 'TEXT')}"
+            for name, info in properties.items()
+        )
+        self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(
+            f"CREATE TABLE {table} ("
+            '"_id" TEXT PRIMARY KEY, "_created_time" TEXT, "_last_edited_time" TEXT, '
+            f'"_epoch" REAL, "_row" TEXT{", " + cols if cols else ""})'
+        )
+
+    async def sync_database(
+        self,
+        notion: AsyncClient,
+        database_id: str,
+        schema_json: str,
+        full: bool = False,
+    ) -> int:
+        """Bring the local copy of ``database_id`` up to date.
+
+        Only rows edited since the previous sync are fetched unless ``full`` is
+        set, the schema changed, or ``full_sync_interval`` has elapsed. A full
+        sync also removes rows that no longer exist in Notion.
+
+        Returns the number of rows written.
+        """
+        properties = json.loads(schema_json or "{}")
+        schema_hash = _schema_hash(properties)
+
+        now = time.time()
+        meta = self._meta(database_id)
+        if meta is None or meta[0] != schema_hash:
+            self._create_table(database_id, properties)
+            full = True
+        elif now - (meta[2] or 0) >= self.full_sync_interval:
+            full = True
+        cursor = None if full or meta is None else meta[3]
+
+        table = _quote(_table_name(database_id))
+        names = list(properties)
+        placeholders = ", ".join("?" for _ in range(len(names) + 5))
+        insert = (
+            f"INSERT OR REPLACE INTO {table} "
+            f'("_id", "_created_time", "_last_edited_time", "_epoch", "_row"'
+            f'{"".join(", " + _quote(n) for n in names)}) VALUES ({placeholders})'
+        )
+
+        query_kwargs: Dict[str, Any] = {"database_id": database_id, "page_size": PAGE_SIZE}
+        if cursor:
+            query_kwargs["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": cursor}}
+
+        written = 0
+        newest = cursor
+        start_cursor = None
+        while True:
+            if start_cursor:
+                query_kwargs["start_cursor"] = start_cursor
+            resp = await notion.databases.query(**query_kwargs)
+            rows = []
+            for page in resp.get("results", []):
+                props = page.get("properties", {})
+                edited = page.get("last_edited_time")
+                if edited and (newest is None or edited > newest):
+                    newest = edited
+                simplified = {name: _extract_property_value(pval) for name, pval in props.items()}
+                rows.append((
+                    page.get("id"),
+                    _normalize_date(page.get("created_time")),
+                    _normalize_date(edited),
+                    now,
+                    json.dumps({"id": page.get("id"), "properties": simplified}),
+                    *(_column_value(props[n]) if n in props else None for n in names),
+                ))
+            self._conn.executemany(insert, rows)
+            written += len(rows)
+            if resp.get("has_more"):
+                start_cursor = resp.get("next_cursor")
+            else:
+                break
+
+        if full:
+            self._conn.execute(f'DELETE FROM {table} WHERE "_epoch" < ?', (now,))
+        self._conn.execute(
+            "INSERT OR REPLACE INTO _mirror_meta VALUES (?, ?, ?, ?, ?)",
+            (database_id, schema_hash, now, now if full else meta[2], newest),
+        )
+        self._conn.commit()
+        logger.info("Mirrored %d rows of database %s (full=%s)", written, database_id, full)
+        return written
+
+    async def sync_all(self, notion: AsyncClient, tool_data: List[Dict[str, Any]]) -> None:
+        """Sync every database item in ``tool_data``; failures are logged and skipped."""
+        for item in tool_data:
+            if item.get("type") != "database":
+                continue
+            try:
+                await self.sync_database(notion, item["id"], item.get("schema") or "{}")
+            except Exception as e:
+                logger.error("Failed to mirror database %s: %s", item["id"], e)
+
+    async def run_sync_loop(
+        self,
+        sources: Callable[[], Iterable[Tuple[AsyncClient, List[Dict[str, Any]]]]],
+        interval: float = MIRROR_SYNC_INTERVAL,
+    ) -> None:
+        """Re-sync databases every ``interval`` seconds until cancelled.
+
+        ``sources`` is called before each pass and returns the ``(notion,
+        tool_data)`` pairs to sync, so catalogs loaded in the meantime are
+        picked up.
+        """
+        while True:
+            for notion, tool_data in sources():
+                await self.sync_all(notion, tool_data)
+            await asyncio.sleep(interval)
+
+    def is_fresh(self, database_id: str, schema_json: str) -> bool:
+        """Whether ``database_id`` was synced recently with the given schema."""
+        meta = self._meta(database_id)
+        return (
+            meta is not None
+            and meta[0] == _schema_hash(json.loads(schema_json or "{}"))
+            and time.time() - meta[1] <= self.max_staleness
+        )
+
+    def query(
+        self,
+        database_id: str,
+        schema_json: str,
+        filter_obj: Dict[str, Any] | None,
+        properties: List[str] | None = None,
+        limit: int | None = None,
+    ) -> List[Dict[str, Any]] | None:
+        """Answer a filtered database query locally.
+
+        Returns the rows a live query would: the first page of at most
+        ``limit`` (and never more than ``PAGE_SIZE``) rows in Notion's default
+        order, newest first, in the same shape as ``_simplify_database_query``
+        (restricted to ``properties`` if given). Returns ``None`` when the
+        mirror is stale for this database or the filter cannot be translated,
+        in which case the caller should query Notion instead.
+        """
+        if not self.is_fresh(database_id, schema_json):
+            self.stats["stale"] += 1
+            return None
+        try:
+            where, params = filter_to_sql(filter_obj, schema_columns(json.loads(schema_json or "{}")))
+        except UnsupportedFilterError as e:
+            logger.info("Falling back to live Notion query for %s: %s", database_id, e)
+            self.stats["unsupported"] += 1
+            return None
+        table = _quote(_table_name(database_id))
+        limit = PAGE_SIZE if limit is None else min(limit, PAGE_SIZE)
+        sql = f'SELECT "_row" FROM {table} WHERE {where} ORDER BY "_created_time" DESC, "_id" LIMIT ?'
+        params = [*params, limit]
+        rows = [json.loads(row) for (row,) in self._conn.execute(sql, params)]
+        if properties is not None:
+            for row in rows:
+                row["properties"] = {name: row["properties"][name] for name in properties if name in row["properties"]}
+        self.stats["local_hits"] += 1
+        return rows
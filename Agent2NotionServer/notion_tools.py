@@ -2,7 +2,10 @@ import os
 import json
 import asyncio
 import re
-from typing import List, Tuple, Dict, Any
+import operator
+import tempfile
+from functools import lru_cache
+from typing import List, Tuple, Dict, Any, AsyncIterator, Callable, TYPE_CHECKING
 
 import boto3
 
@@ -14,9 +17,30 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
 
+from notion_index import PageIndex, PageIndexWriter, tokenize
+from notion_markdown import append_blocks, markdown_to_blocks
+from singleflight import SingleFlight, coalesce
+from deadlines import within_deadline
+from hedging import Hedger
+from profiling import span
+
 from logging import getLogger
 logger = getLogger(__name__)
 
+if TYPE_CHECKING:
+    from notion_mirror import NotionMirror
+    from query_cache import QueryCache
+
+# Concurrent identical calls to the functions below share one in-flight call.
+_summary_flight = SingleFlight("summarize")
+_page_blocks_flight = SingleFlight("fetch_page_blocks")
+_db_filter_flight = SingleFlight("build_db_filter")
+_search_flight = SingleFlight("search_notion_data")
+
+# The search pipeline's LLM calls are hedged when they run unusually long.
+_search_agent_hedger = Hedger("run_search_agent")
+_db_filter_hedger = Hedger("build_db_filter")
+
 # Models for tool inputs
 class NotionProperty(BaseModel):
     """Base model for Notion properties"""
@@ -44,7 +68,7 @@ class DatabaseEntryInput(BaseModel):
 
 class PageTextInput(BaseModel):
     """Input for appending text to a page"""
-    text: str
+    text: str = Field(..., description="Text to append; markdown headings, lists, quotes and code blocks are kept")
 
 
 
@@ -73,41 +97,54 @@ def get_page_title(page_data: dict) -> str | None:
         return None
 
 
-async def fetch_databases_and_pages(notion: AsyncClient) -> Tuple[List[dict], List[dict]]:
-    """Fetch all databases and pages accessible to the integration"""
-    databases: List[dict] = []
-    pages: List[dict] = []
+# Largest page size the Notion search endpoint accepts.
+SEARCH_PAGE_SIZE = 100
 
-    start_cursor = None
-    while True:
-        resp = await notion.search(filter={"property": "object", "value": "database"}, start_cursor=start_cursor)
-        results = resp.get("results", [])
-        databases.extend(results)
-        logger.info(f"Fetched {len(databases)} databases")
-        if resp.get("has_more"):
-            start_cursor = resp.get("next_cursor")
-        else:
-            break
 
+async def crawl_workspace(notion: AsyncClient) -> AsyncIterator[dict]:
+    """Yield every database and page accessible to the integration, one at a time.
+
+    A single search cursor over both object types is used with the largest
+    page size, so at most one page of results is held at a time. Pages that
+    are rows of a database are skipped; the search endpoint cannot exclude
+    them, so they are still part of the responses.
+    """
     start_cursor = None
+    seen = 0
     while True:
-        resp = await notion.search(filter={"property": "object", "value": "page"}, start_cursor=start_cursor)
-        results = resp.get("results", [])
-        results = [r for r in results if r.get("parent", {}).get("type") != "database_id"]
-        pages.extend(results)
-        for p in results:
-            logger.info(get_page_title(p))
-        logger.info(f"Fetched {len(pages)} pages")
+        kwargs: Dict[str, Any] = {"page_size": SEARCH_PAGE_SIZE}
+        if start_cursor:
+            kwargs["start_cursor"] = start_cursor
+        resp = await notion.search(**kwargs)
+        for result in resp.get("results", []):
+            if result.get("object") == "page" and result.get("parent", {}).get("type") == "database_id":
+                continue
+            seen += 1
+            yield result
+        logger.info("Crawled %d databases and pages", seen)
         if resp.get("has_more"):
             start_cursor = resp.get("next_cursor")
         else:
             break
 
-    return databases, pages
+
+_SUMMARY_INSTRUCTIONS = {
+    "database": "Summarize the provided Notion database.",
+    "page": "Provide a short summary of the following page content.",
+}
+
+# Approximate prompt-token budget for one batched summarization request. Set to
+# 0 to summarize every item with its own request.
+SUMMARY_BATCH_TOKENS = int(os.getenv("NOTION_SUMMARY_BATCH_TOKENS", "6000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for prompt budgeting."""
+    return len(text) // 4 + 1
 
 
-async def summarize_database(notion: AsyncClient, db: dict) -> str:
-    """Create a short summary of a database combining schema and sample content"""
+async def _database_summary_input(notion: AsyncClient, db: dict) -> str:
+    """Build the text the LLM summarizes for a database: name, schema and sample entries."""
     # Build schema description
     props = db.get("properties", {})
     schema_parts = [f"{name} ({info.get('type')})" for name, info in props.items()]
@@ -124,26 +161,23 @@ async def summarize_database(notion: AsyncClient, db: dict) -> str:
                 entry_titles.append(texts[0].get("plain_text", ""))
     entries_text = "; ".join(entry_titles)
 
-    content_for_llm = (
+    return (
         f"Database name: {db.get('title', [{}])[0].get('plain_text', 'Untitled')}\n"
         f"Schema: {schema_text}\n"
         f"Example entries: {entries_text}"
     )
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "Summarize the provided Notion database."),
-        ("human", "{text}")
-    ])
-    llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL)
-    summary_raw = (await llm.ainvoke(prompt.format_messages(text=content_for_llm))).content
-    return str(summary_raw)
 
+async def _page_summary_input(notion: AsyncClient, page: dict, blocks: List[dict] | None = None) -> str:
+    """Build the text the LLM summarizes for a page: its title and the start of its content.
 
-async def summarize_page(notion: AsyncClient, page: dict) -> str:
-    """Create a summary of a Notion page"""
-    blocks = await notion.blocks.children.list(block_id=page["id"], page_size=20)
+    ``blocks`` may carry the page's already-fetched blocks; otherwise the first
+    20 are requested from Notion.
+    """
+    if blocks is None:
+        blocks = (await notion.blocks.children.list(block_id=page["id"], page_size=20)).get("results", [])
     texts = []
-    for block in blocks.get("results", []):
+    for block in blocks[:20]:
         typ = block.get("type")
         rich = block.get(typ, {}).get("rich_text", [])
         if rich:
@@ -152,24 +186,120 @@ async def summarize_page(notion: AsyncClient, page: dict) -> str:
 
     # Include the page title to give the LLM more context when producing the summary.
     page_title = get_page_title(page) or "Untitled"
-    content_for_llm = f"Page title: {page_title}\nPage content: {content}"
+    return f"Page title: {page_title}\nPage content: {content}"
 
+
+@coalesce(_summary_flight, lambda a: (a["kind"], a["content"]))
+async def _summarize_content(kind: str, content: str) -> str:
+    """Summarize one database or page (``kind``) with its own LLM request."""
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "Provide a short summary of the following page content."),
+        ("system", _SUMMARY_INSTRUCTIONS[kind]),
         ("human", "{text}")
     ])
     llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL)
-    summary_raw = (await llm.ainvoke(prompt.format_messages(text=content_for_llm))).content
+    summary_raw = (await llm.ainvoke(prompt.format_messages(text=content))).content
     # Ensure the returned value is a string to satisfy type checkers.
     return str(summary_raw)
 
 
+class ItemSummary(BaseModel):
+    """Summary of one item in a batched summarization request."""
+    key: str
+    summary: str
+
+
+class BatchSummaryOutput(BaseModel):
+    """Summaries for a batch of pages and databases, one per item key."""
+    summaries: List[ItemSummary] = Field(default_factory=list)
+
+
+def _pack_batches(items: List[Tuple[str, str, str]], budget: int) -> List[List[Tuple[str, str, str]]]:
+    """Group ``(id, kind, content)`` items into batches of at most ``budget`` estimated tokens.
+
+    An item larger than the budget gets a batch of its own.
+    """
+    batches: List[List[Tuple[str, str, str]]] = []
+    current: List[Tuple[str, str, str]] = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(item[2])
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _summarize_batch(batch: List[Tuple[str, str, str]]) -> Dict[str, str]:
+    """Summarize several items with one structured-output request.
+
+    Items are labelled with short keys rather than their Notion IDs so the
+    model only has to echo a few characters back. Returns item ID → summary
+    for every item the model answered; anything missing is left to the caller.
+    """
+    keyed = {f"item{n}": item for n, item in enumerate(batch)}
+    text = "\n\n".join(f"[{key}] ({item[1]})\n{item[2]}" for key, item in keyed.items())
+
+    system = (
+        "Summarize each of the following Notion items independently. "
+        "For a database: " + _SUMMARY_INSTRUCTIONS["database"] + " "
+        "For a page: " + _SUMMARY_INSTRUCTIONS["page"] + " "
+        "Return exactly one summary per item, using the key shown in brackets before the item."
+    )
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system),
+        ("human", "{text}")
+    ])
+    llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL).with_structured_output(BatchSummaryOutput)
+    try:
+        out = await llm.ainvoke(prompt.format_messages(text=text))
+    except Exception as e:
+        logger.error("Batched summarization of %d items failed: %s", len(batch), e)
+        return {}
+    from typing import cast
+    summaries = cast(BatchSummaryOutput, out).summaries
+    return {keyed[s.key][0]: s.summary for s in summaries if s.key in keyed and s.summary.strip()}
+
+
+async def summarize_items(
+    items: List[Tuple[str, str, str]],
+    budget: int = SUMMARY_BATCH_TOKENS,
+) -> Dict[str, str]:
+    """Summarize ``(id, kind, content)`` items, packing many into each LLM request.
+
+    Items are batched up to ``budget`` estimated prompt tokens per request.
+    Items a batch fails to return (parse errors, missing or unknown keys) are
+    retried with one request each. A ``budget`` of 0 disables batching.
+
+    Returns
+    -------
+    Dict[str, str]
+        Mapping of item ID → summary.
+    """
+    summaries: Dict[str, str] = {}
+    if budget > 0:
+        for batch in _pack_batches(items, budget):
+            summaries.update(await _summarize_batch(batch))
+
+    missing = [item for item in items if item[0] not in summaries]
+    if budget > 0 and missing:
+        logger.info("Retrying %d of %d items individually", len(missing), len(items))
+    for item_id, kind, content in missing:
+        summaries[item_id] = await _summarize_content(kind, content)
+    return summaries
+
+
+@coalesce(_page_blocks_flight, lambda a: (id(a["notion"]), a["page_id"]))
 async def fetch_page_blocks(notion: AsyncClient, page_id: str) -> List[dict]:
     """Return all block objects for the given page."""
     blocks: List[dict] = []
     cursor = None
     while True:
-        resp = await notion.blocks.children.list(block_id=page_id, start_cursor=cursor)
+        with span("notion.blocks.children.list", page_id=page_id):
+            resp = await within_deadline(notion.blocks.children.list(block_id=page_id, start_cursor=cursor))
         blocks.extend(resp.get("results", []))
         if resp.get("has_more"):
             cursor = resp.get("next_cursor")
@@ -178,9 +308,9 @@ async def fetch_page_blocks(notion: AsyncClient, page_id: str) -> List[dict]:
     return blocks
 
 
-def _db_tool_func(database_id: str):
+def _db_tool_func(database_id: str, client: AsyncClient | None = None):
     async def _func(entry: DatabaseEntryInput) -> str:
-        notion = AsyncClient(auth=os.getenv("NOTION_TOKEN"))
+        notion = client or AsyncClient(auth=os.getenv("NOTION_TOKEN"))
 
         # Determine the raw property mapping supplied by the caller. We support
         # two styles:
@@ -212,78 +342,149 @@ def _db_tool_func(database_id: str):
                     "Expected dict or NotionProperty."
                 )
 
-        await notion.pages.create(parent={"database_id": database_id}, properties=processed_properties)
+        with span("notion.pages.create", database_id=database_id):
+            await notion.pages.create(parent={"database_id": database_id}, properties=processed_properties)
         return "Entry created"
     return _func
 
 
-def _page_tool_func(page_id: str):
+def _page_tool_func(page_id: str, client: AsyncClient | None = None):
     async def _func(text_input: PageTextInput) -> str:
-        notion = AsyncClient(auth=os.getenv("NOTION_TOKEN"))
-        await notion.blocks.children.append(
-            block_id=page_id,
-            children=[{
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {"rich_text": [{"type": "text", "text": {"content": text_input.text}}]}
-            }]
-        )
+        notion = client or AsyncClient(auth=os.getenv("NOTION_TOKEN"))
+        await append_blocks(notion, page_id, markdown_to_blocks(text_input.text))
         return "Text added to page"
     return _func
 
 
-async def build_tool_metadata() -> List[Dict[str, Any]]:
-    """Return metadata for all databases and pages accessible to the integration."""
+async def stream_tool_metadata(
+    page_index: PageIndex | PageIndexWriter | None = None,
+    budget: int = SUMMARY_BATCH_TOKENS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield metadata for every database and page accessible to the integration.
+
+    Items flow from ``crawl_workspace`` into summarization as they are found.
+    They are summarized in batches of up to ``budget`` estimated prompt tokens
+    (see ``summarize_items``) and yielded as soon as their batch is done, so
+    only one batch is held in memory however large the workspace is.
+
+    When ``page_index`` is given, every page's full block list is fetched and
+    added to it so that page searches can be answered from the index. Pass a
+    ``PageIndexWriter`` to keep that flat too.
+    """
     notion = AsyncClient(auth=os.getenv("NOTION_TOKEN"))
-    logger.info("Fetching databases and pages")
-    databases, pages = await fetch_databases_and_pages(notion)
-    metadata: List[Dict[str, Any]] = []
-
-    for db in databases:
-        summary = await summarize_database(notion, db)
-        logger.info(f"Summarized database {db['id']}: {summary}")
-
-        # Extract the display title of the database for easier reference.
-        db_title = db.get("title", [{}])[0].get("plain_text", "Untitled")
-
-        # Include the raw Notion schema as a separate JSON-encoded string so that callers can
-        # access an exact representation of the database schema without having to parse the
-        # human-readable summary. Only database items include this additional field.
-        schema_json = json.dumps(db.get("properties", {}))
-
-        metadata.append({
-            "id": db["id"],
-            "type": "database",
-            "title": db_title,
-            "summary": summary,
-            "schema": schema_json,
-        })
-
-    for page in pages:
-        summary = await summarize_page(notion, page)
-        logger.info(f"Summarized page {page['id']}: {summary}")
-
-        page_title = get_page_title(page) or "Untitled"
-
-        metadata.append({
-            "id": page["id"],
-            "type": "page",
-            "title": page_title,
-            "summary": summary,
-        })
-
-    await notion.aclose()
-    return metadata
-
-
-async def generate_and_cache_tool_metadata(file_path: str) -> List[Dict[str, Any]]:
-    """Generate tool metadata and save it to a JSON file."""
-    metadata = await build_tool_metadata()
-    with open(file_path, "w") as f:
-        json.dump(metadata, f, indent=2)
-    return metadata
-
-def load_tool_data(path: str | None) -> List[Dict[str, Any]]:
+    pending: List[Tuple[Tuple[str, str, str], Dict[str, Any]]] = []
+    used = 0
+
+    async def flush() -> List[Dict[str, Any]]:
+        summaries = await summarize_items([item for item, _ in pending], budget)
+        records = []
+        for (item_id, kind, _), record in pending:
+            logger.info(f"Summarized {kind} {item_id}: {summaries[item_id]}")
+            # Keep the established key order: id, type, title, summary[, schema]
+            records.append({"id": item_id, "type": kind, "title": record["title"], "summary": summaries[item_id],
+                            **({"schema": record["schema"]} if "schema" in record else {})})
+        return records
+
+    try:
+        logger.info("Fetching databases and pages")
+        async for obj in crawl_workspace(notion):
+            if obj.get("object") == "database":
+                content = await _database_summary_input(notion, obj)
+                item = (obj["id"], "database", content)
+                # Include the raw Notion schema as a separate JSON-encoded string so that callers can
+                # access an exact representation of the database schema without having to parse the
+                # human-readable summary. Only database items include this additional field.
+                record = {
+                    "title": obj.get("title", [{}])[0].get("plain_text", "Untitled"),
+                    "schema": json.dumps(obj.get("properties", {})),
+                }
+            else:
+                blocks = None
+                if page_index is not None:
+                    blocks = await fetch_page_blocks(notion, obj["id"])
+                    page_index.add_page(obj["id"], blocks)
+                content = await _page_summary_input(notion, obj, blocks)
+                item = (obj["id"], "page", content)
+                record = {"title": get_page_title(obj) or "Untitled"}
+
+            cost = estimate_tokens(content)
+            if pending and (budget <= 0 or used + cost > budget):
+                for metadata in await flush():
+                    yield metadata
+                pending, used = [], 0
+            pending.append((item, record))
+            used += cost
+
+        if pending:
+            for metadata in await flush():
+                yield metadata
+    finally:
+        await notion.aclose()
+
+
+def _temp_file_for(path: str) -> str:
+    """Create an empty temporary file next to ``path`` so it can replace it atomically."""
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    return temp_path
+
+
+async def generate_and_cache_tool_metadata(file_path: str, index_path: str | None = None) -> int:
+    """Generate tool metadata and write it to ``file_path`` as it is produced.
+
+    Files ending in ``.ndjson`` or ``.jsonl`` get one JSON object per line;
+    anything else gets a JSON array. Either way each item is written as soon
+    as its summary batch finishes. If ``index_path`` is given, the page index
+    built alongside the metadata is written there as well; it is built on
+    disk with ``PageIndexWriter``.
+
+    Both files are written to temporary files next to them and only replace
+    the existing ones once the whole refresh succeeded, so a failed refresh
+    leaves the previous catalog and index in place.
+
+    Returns the number of items written.
+    """
+    page_index = PageIndexWriter() if index_path is not None else None
+    ndjson = file_path.endswith((".ndjson", ".jsonl"))
+    count = 0
+    temp_paths = {file_path: _temp_file_for(file_path)}
+    if index_path is not None:
+        temp_paths[index_path] = _temp_file_for(index_path)
+    try:
+        with open(temp_paths[file_path], "w") as f:
+            if not ndjson:
+                f.write("[")
+            async for metadata in stream_tool_metadata(page_index):
+                if ndjson:
+                    f.write(json.dumps(metadata) + "\n")
+                else:
+                    f.write(("," if count else "") + "\n  " + json.dumps(metadata))
+                count += 1
+            if not ndjson:
+                f.write("\n]\n")
+        if page_index is not None:
+            with open(temp_paths[index_path], "w") as f:
+                page_index.write(f)
+        for path, temp_path in temp_paths.items():
+            os.replace(temp_path, path)
+    finally:
+        for temp_path in temp_paths.values():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if page_index is not None:
+            page_index.close()
+    return count
+
+
+def _parse_tool_data(text: str) -> List[Dict[str, Any]]:
+    """Parse tool metadata stored either as a JSON array or as NDJSON."""
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def load_tool_data(path: str | None, key: str | None = None) -> List[Dict[str, Any]]:
     """Load tool metadata from S3 or a local override.
 
     Parameters
@@ -293,37 +494,34 @@ def load_tool_data(path: str | None) -> List[Dict[str, Any]]:
         bucket specified by ``NOTION_TOOL_DATA_BUCKET`` (default ``notionserver``)
         using the key given by ``NOTION_TOOL_DATA_KEY`` (default
         ``notion_tools_data.json``).
+    key : str | None
+        Optional S3 key overriding ``NOTION_TOOL_DATA_KEY``.
 
     Returns
     -------
     list[dict]
-        Parsed JSON data describing available pages and databases.
+        Parsed data describing available pages and databases, stored either
+        as a JSON array or as NDJSON (one item per line).
     """
     if path is not None:
         with open(path, "r") as f:
-            return json.load(f)
+            return _parse_tool_data(f.read())
 
     bucket = os.getenv("NOTION_TOOL_DATA_BUCKET", "notionserver")
-    key = os.getenv("NOTION_TOOL_DATA_KEY", "notion_tools_data.json")
+    key = key or os.getenv("NOTION_TOOL_DATA_KEY", "notion_tools_data.json")
     s3 = boto3.client("s3")
     try:
         obj = s3.get_object(Bucket=bucket, Key=key)
         data = obj["Body"].read().decode("utf-8")
         logger.info("Loaded tool data from s3://%s/%s", bucket, key)
-        return json.loads(data)
+        return _parse_tool_data(data)
     except Exception as e:  # pragma: no cover - network errors
         logger.info(
             "Failed to load tool data from s3://%s/%s: %s", bucket, key, e
         )
         local_path = os.path.join(os.path.dirname(__file__), key)
         with open(local_path, "r") as f:
-            return json.load(f)
-
-
-async def generate_tool_metadata_json() -> str:
-    """Return the metadata as a pretty-printed JSON string (no disk I/O)."""
-    metadata = await build_tool_metadata()
-    return json.dumps(metadata, indent=2)
+            return _parse_tool_data(f.read())
 
 
 def load_tool_data_from_env() -> List[Dict[str, Any]]:
@@ -332,7 +530,7 @@ def load_tool_data_from_env() -> List[Dict[str, Any]]:
     return load_tool_data(data_path)
 
 
-def load_db_instructions(path: str | None) -> Dict[str, str]:
+def load_db_instructions(path: str | None, key: str | None = None) -> Dict[str, str]:
     """Load database-specific instructions from S3 or a local override.
 
     Parameters
@@ -341,13 +539,15 @@ def load_db_instructions(path: str | None) -> Dict[str, str]:
         Optional local file path. If ``None`` the instructions are loaded from
         the S3 bucket defined by ``NOTION_TOOL_DATA_BUCKET`` (default
         ``notionserver``) using the filename ``db_custom_instructions.json``.
+    key : str | None
+        Optional S3 key overriding ``db_custom_instructions.json``.
 
     Returns
     -------
     Dict[str, str]
         Mapping of database ID → custom instruction text.
     """
-    filename = "db_custom_instructions.json"
+    filename = key or "db_custom_instructions.json"
     if path is not None:
         with open(path, "r") as f:
             return json.load(f)
@@ -374,6 +574,47 @@ def load_db_instructions_from_env() -> Dict[str, str]:
     return load_db_instructions(instr_path)
 
 
+# Number of databases whose filters are generated speculatively while the
+# search agent is still choosing items (0 disables speculation).
+SPECULATION_WIDTH = int(os.getenv("NOTION_SPECULATION_WIDTH", "0"))
+
+# How many speculative filters were started, turned out to be needed, or were
+# discarded (``cancelled`` counts the discarded ones stopped before finishing).
+SPECULATION_STATS = {"speculated": 0, "used": 0, "wasted": 0, "cancelled": 0}
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "all", "any", "do", "for", "from", "have", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "show", "that", "the", "this", "to", "what", "which", "with",
+}
+
+
+def rank_databases(query: str, tool_data: List[Dict[str, Any]]) -> List[str]:
+    """Cheaply rank catalog databases by word overlap with ``query``.
+
+    Title words count double; databases sharing no words with the query are
+    left out. Used to guess, without an LLM call, which databases the search
+    agent is likely to pick.
+    """
+    query_tokens = set(tokenize(query)) - _STOPWORDS
+    scored = []
+    for item in tool_data:
+        if item.get("type") != "database":
+            continue
+        title_tokens = set(tokenize(item.get("title", "")))
+        other_tokens = set(tokenize(item.get("summary", ""))) | set(json.loads(item.get("schema") or "{}"))
+        other_tokens = {t for name in other_tokens for t in tokenize(name)}
+        score = 2 * len(query_tokens & title_tokens) + len(query_tokens & other_tokens)
+        if score:
+            scored.append((score, item["id"]))
+    return [dbid for _, dbid in sorted(scored, key=lambda s: s[0], reverse=True)]
+
+
+def _schema_for(tool_data: List[Dict[str, Any]], dbid: str) -> str:
+    # tool_data items store the raw Notion schema JSON (a *string*).
+    raw_schema = next((it.get("schema") for it in tool_data if it["id"] == dbid), None)
+    return raw_schema if isinstance(raw_schema, str) else "{}"
+
+
 class SearchAgentOutput(BaseModel):
     """IDs for relevant pages and databases."""
     page_ids: List[str] = Field(default_factory=list)
@@ -398,10 +639,19 @@ async def run_search_agent(query: str, tool_data: List[Dict[str, Any]]) -> Searc
     ])
 
     llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL).with_structured_output(SearchAgentOutput)
+    messages = prompt.format_messages(query=query)
     from typing import cast
-    return cast(SearchAgentOutput, await llm.ainvoke(prompt.format_messages(query=query)))
+    with span("llm.run_search_agent"):
+        return cast(SearchAgentOutput, await within_deadline(_search_agent_hedger.run(lambda: llm.ainvoke(messages))))
 
 
+@coalesce(_db_filter_flight, lambda a: (
+    a["query"],
+    a["schema_json"],
+    a["guide_text"],
+    a["db_id"],
+    (a["custom_instructions"] or {}).get(a["db_id"]),
+))
 async def build_db_filter(
     query: str,
     schema_json: str,
@@ -433,7 +683,9 @@ async def build_db_filter(
     ])
 
     llm = ChatOpenAI(temperature=0, model=OPENAI_MODEL, model_kwargs={"response_format": {"type": "json_object"}})
-    resp = await llm.ainvoke(prompt.format_messages(query=query, schema=schema_json))
+    messages = prompt.format_messages(query=query, schema=compact_schema(schema_json))
+    with span("llm.build_db_filter", database_id=db_id):
+        resp = await within_deadline(_db_filter_hedger.run(lambda: llm.ainvoke(messages)))
 
     try:
         data = json.loads(resp.content)
@@ -445,21 +697,50 @@ async def build_db_filter(
     return data
 
 
-def build_tools_from_data(data: List[Dict[str, Any]]) -> List[StructuredTool]:
+_OPTION_PROPERTY_TYPES = ("select", "multi_select", "status")
+
+
+@lru_cache(maxsize=256)
+def compact_schema(schema_json: str) -> str:
+    """Return a token-efficient version of a raw Notion schema for prompts.
+
+    Property ids, option ids, colours and other configuration are dropped;
+    each property maps to its type, or for select, multi_select and status
+    properties to ``{<type>: [<option name>, ...]}``::
+
+        {"Name":"title","Status":{"status":["Not started","Done"]}}
+    """
+    compact: Dict[str, Any] = {}
+    for name, info in json.loads(schema_json or "{}").items():
+        typ = info.get("type", "")
+        if typ in _OPTION_PROPERTY_TYPES:
+            options = (info.get(typ) or {}).get("options", [])
+            compact[name] = {typ: [opt.get("name") for opt in options]}
+        else:
+            compact[name] = typ
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+
+
+def build_tools_from_data(data: List[Dict[str, Any]], notion: AsyncClient | None = None) -> List[StructuredTool]:
+    """Create one add-to-Notion tool per catalog item.
+
+    The tools use ``notion`` for their API calls if given, otherwise a client
+    created from ``NOTION_TOKEN`` on every call.
+    """
     tools: List[StructuredTool] = []
     name_set = set()
     for item in data:
         if item["type"] == "database":
-            func = _db_tool_func(item["id"])
+            func = _db_tool_func(item["id"], notion)
         else:
-            func = _page_tool_func(item["id"])
+            func = _page_tool_func(item["id"], notion)
         # Build a rich description that starts with the item's title, followed by the human-readable
-        # summary. If the item represents a database, also append the raw JSON schema so that
-        # downstream agents have full access to the database structure.
+        # summary. If the item represents a database, also append its compacted JSON schema so
+        # that downstream agents know the property names, types and options.
         title = item.get("title", "Untitled")
         description_parts = [f"Title: {title}", item.get("summary", "")]
         if item.get("type") == "database" and "schema" in item:
-            description_parts.append(f"Schema (JSON):\n{item['schema']}")
+            description_parts.append(f"Schema (JSON):\n{compact_schema(item['schema'])}")
 
         description = "\n\n".join(description_parts).strip()
 
@@ -473,6 +754,7 @@ def build_tools_from_data(data: List[Dict[str, Any]]) -> List[StructuredTool]:
                     coroutine=func,
                     name=name,
                     description=description,
+                    metadata={"notion_id": item["id"], "notion_type": item["type"], "notion_title": title},
                 )
             )
     return tools
@@ -480,7 +762,11 @@ def build_tools_from_data(data: List[Dict[str, Any]]) -> List[StructuredTool]:
 # === Helper functions for plain-text extraction =====================================
 def _rich_text_to_str(rich_list: List[dict]) -> str:
     """Return concatenated plain_text from a Notion rich_text list."""
-    return "".join(rt.get("plain_text", "") for rt in rich_list or [])
+    if not rich_list:
+        return ""
+    if len(rich_list) == 1:
+        return rich_list[0].get("plain_text", "")
+    return "".join([rt.get("plain_text", "") for rt in rich_list])
 
 
 def _extract_property_value(prop: dict) -> Any:
@@ -519,6 +805,44 @@ def _extract_property_value(prop: dict) -> Any:
             return prop.get(typ)
 
 
+def _property_accessor(typ: str) -> Callable[[dict], Any]:
+    """Return a function equivalent to ``_extract_property_value`` for ``typ`` properties."""
+    match typ:
+        case "title" | "rich_text":
+            def get_text(prop: dict) -> str:
+                rich = prop.get(typ)
+                if not rich:
+                    return ""
+                if len(rich) == 1:
+                    return rich[0].get("plain_text", "")
+                return "".join([rt.get("plain_text", "") for rt in rich])
+            return get_text
+        case "select" | "status":
+            def get_name(prop: dict) -> str | None:
+                value = prop.get(typ)
+                return value.get("name") if value else None
+            return get_name
+        case "multi_select":
+            return lambda prop: [opt.get("name") for opt in prop.get("multi_select", [])]
+        case _:
+            return operator.methodcaller("get", typ)
+
+
+@lru_cache(maxsize=256)
+def compile_row_extractor(schema_json: str) -> Tuple[Tuple[str, str, Callable[[dict], Any]], ...]:
+    """Compile a database schema into ``(name, type, accessor)`` column triples.
+
+    Each accessor turns a property object of that column into the same value
+    ``_extract_property_value`` would, without re-dispatching on the property
+    type for every cell. Results are cached per schema string.
+    """
+    properties = json.loads(schema_json or "{}")
+    return tuple(
+        (name, info.get("type", ""), _property_accessor(info.get("type", "")))
+        for name, info in properties.items()
+    )
+
+
 def _blocks_to_text(blocks: List[dict]) -> str:
     """Concatenate all rich_text from a list of block objects."""
     parts: List[str] = []
@@ -532,7 +856,26 @@ def _blocks_to_text(blocks: List[dict]) -> str:
     return "\n".join(parts)
 
 
-def _simplify_database_query(resp: dict) -> List[Dict[str, Any]]:
+def _columns_match(
+    columns: Tuple[Tuple[str, str, Callable[[dict], Any]], ...],
+    props: dict,
+    exact: bool = True,
+) -> bool:
+    """Whether a row's properties have the names and types of ``columns``.
+
+    With ``exact`` the row must not carry any other properties either.
+    """
+    return (not exact or len(props) == len(columns)) and all(
+        name in props and props[name].get("type") == typ for name, typ, _ in columns
+    )
+
+
+def _simplify_database_query(
+    resp: dict,
+    schema_json: str | None = None,
+    columnar: bool = False,
+    properties: List[str] | None = None,
+) -> List[Dict[str, Any]] | Dict[str, Any]:
     """Convert the Notion database query API response into a lightweight form.
 
     Each row is reduced to::
@@ -541,25 +884,110 @@ def _simplify_database_query(resp: dict) -> List[Dict[str, Any]]:
             "id": <page_id>,
             "properties": {<prop_name>: <simplified value>, ...}
         }
+
+    If ``schema_json`` is given, values are read through the extractor compiled
+    for that schema. The schema is checked against the first row and the
+    generic per-cell path is used if it has drifted from the live database.
+
+    With ``columnar`` the rows are instead returned column by column::
+
+        {"id": [<page_id>, ...], "properties": {<prop_name>: [<value>, ...], ...}}
+
+    ``properties`` restricts the output to the named properties.
     """
+    results = resp.get("results", [])
+    first = results[0].get("properties", {}) if results else {}
+    columns = compile_row_extractor(schema_json) if schema_json else None
+    if columns is not None and properties is not None:
+        columns = tuple(col for col in columns if col[0] in properties)
+    if columns is not None and results and not _columns_match(columns, first, exact=properties is None):
+        columns = None
+
+    if columnar:
+        if columns is None:
+            names = [name for name in (properties if properties is not None else first) if name in first]
+            columns = tuple((name, "", _extract_property_value) for name in names)
+        return _simplify_columnar(results, columns)
+
     simplified: List[Dict[str, Any]] = []
-    for page in resp.get("results", []):
+    if columns is not None:
+        for page in results:
+            props = page.get("properties", {})
+            simplified.append({"id": page.get("id"), "properties": {name: get(props[name]) for name, _, get in columns}})
+        return simplified
+
+    for page in results:
         props = page.get("properties", {})
+        if properties is not None:
+            props = {name: props[name] for name in properties if name in props}
         simplified_props = {name: _extract_property_value(pval) for name, pval in props.items()}
         simplified.append({"id": page.get("id"), "properties": simplified_props})
     return simplified
 
+
+def _simplify_columnar(
+    results: List[dict],
+    columns: Tuple[Tuple[str, str, Callable[[dict], Any]], ...],
+) -> Dict[str, Any]:
+    """Build the columnar form of ``results`` in a single pass over the rows.
+
+    The per-column lists are allocated up front and filled by index, which
+    avoids building one temporary list per column.
+    """
+    n = len(results)
+    ids: List[Any] = [None] * n
+    values = [[None] * n for _ in columns]
+    fill = [(column, name, get) for column, (name, _, get) in zip(values, columns)]
+    for i, page in enumerate(results):
+        ids[i] = page.get("id")
+        props = page.get("properties", {})
+        for column, name, get in fill:
+            column[i] = get(props.get(name))
+    return {"id": ids, "properties": {name: column for column, (name, _, _) in zip(values, columns)}}
+
+
+def _rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pivot already-simplified rows into the columnar form."""
+    names = list(rows[0]["properties"]) if rows else []
+    return {
+        "id": [row["id"] for row in rows],
+        "properties": {name: [row["properties"].get(name) for row in rows] for name in names},
+    }
+
 # === High-level search helper =================================================
 # This function centralises the logic originally implemented inside the FastAPI
 # endpoint in main.py so that it can be reused in other contexts (e.g. unit
 # tests, CLI tools, etc.) and keeps main.py thin.
 
+@coalesce(_search_flight, lambda a: (
+    a["query"],
+    id(a["notion"]),
+    id(a["tool_data"]),
+    a["filter_guide"],
+    id(a["db_instructions"]),
+    id(a["mirror"]),
+    id(a["query_cache"]),
+    id(a["page_index"]),
+    a["fetch_pages"],
+    a["columnar"],
+    json.dumps(a["properties"], sort_keys=True),
+    a["max_rows"],
+    a["max_page_chars"],
+))
 async def search_notion_data(
     query: str,
     notion: AsyncClient,
     tool_data: List[Dict[str, Any]],
     filter_guide: str,
     db_instructions: Dict[str, str] | None = None,
+    mirror: "NotionMirror | None" = None,
+    query_cache: "QueryCache | None" = None,
+    page_index: PageIndex | None = None,
+    fetch_pages: bool = False,
+    columnar: bool = False,
+    properties: Dict[str, List[str]] | None = None,
+    max_rows: int | None = None,
+    max_page_chars: int | None = None,
 ) -> Dict[str, Any]:
     """Run an LLM-powered search over Notion content.
 
@@ -571,52 +999,146 @@ async def search_notion_data(
         An already-configured Notion client instance.
     tool_data : List[Dict[str, Any]]
         Cached metadata describing pages and databases (as produced by
-        ``build_tool_metadata`` and persisted via ``generate_tool_metadata_json``).
+        ``stream_tool_metadata`` and persisted via ``generate_and_cache_tool_metadata``).
     filter_guide : str
         Prompt text that guides the LLM when building database filter objects.
     db_instructions : Dict[str, str] | None
         Optional mapping of database IDs to additional instructions that should
         be appended to the system prompt when building filters.
+    mirror : NotionMirror | None
+        Optional local SQLite mirror. Database queries are answered from it
+        when it is fresh and the filter can be translated to SQL; otherwise
+        Notion is queried live.
+    query_cache : QueryCache | None
+        Optional shared cache of live database query responses, checked
+        after the mirror. Queries made often are kept warm by its background
+        loop.
+    page_index : PageIndex | None
+        Optional inverted index of page contents. Indexed pages are answered
+        with ranked snippets from it instead of their live blocks.
+    fetch_pages : bool
+        Fetch the full, live text of every selected page even when it is
+        present in ``page_index``.
+    columnar : bool
+        Return each database's rows column by column (see
+        ``_simplify_database_query``) instead of as a list of row dicts.
+    properties : Dict[str, List[str]] | None
+        Optional mapping of database ID → property names to return. Databases
+        not listed return every property.
+    max_rows : int | None
+        Maximum number of rows returned per database.
+    max_page_chars : int | None
+        Truncate each page's text to this many characters.
 
     Returns
     -------
     Dict[str, Any]
         A mapping with two keys:
-        * ``"pages"`` – mapping of page_id → list[block] (full block objects).
+        * ``"pages"`` – mapping of page_id → page text (ranked snippets when
+          answered from ``page_index``, best match first).
         * ``"databases"`` – mapping of database_id → query results returned by
           the Notion API for that DB (after applying an LLM-generated filter).
     """
     logger.info("Running search agent for query: %s", query)
 
-    # Ask the LLM which pages and databases are relevant.
-    agent_out = await run_search_agent(query, tool_data)
-
-    # Results will contain already-simplified text/values rather than the raw
-    # Notion API payloads so that callers can work with them directly.
-    pages: Dict[str, str] = {}
-    databases: Dict[str, List[Dict[str, Any]]] = {}
-
-    # Fetch full block contents for each relevant page so that the caller
-    # receives the complete context and can decide what to display.
-    for pid in agent_out.page_ids:
-        blocks = await fetch_page_blocks(notion, pid)
-        pages[pid] = _blocks_to_text(blocks)
-
-    # For databases we need an additional step: build a filter so that the
-    # resulting query only returns rows that match the user's intent.
-    for dbid in agent_out.database_ids:
-        # tool_data items store the raw Notion schema JSON (a *string*).
-        raw_schema = next((it.get("schema") for it in tool_data if it["id"] == dbid), None)
-        schema_json: str = raw_schema if isinstance(raw_schema, str) else "{}"
-
-        filter_obj = await build_db_filter(
-            query,
-            schema_json,
-            filter_guide,
-            dbid,
-            db_instructions,
-        )
-        raw_resp = await notion.databases.query(database_id=dbid, filter=filter_obj["filter"])
-        databases[dbid] = _simplify_database_query(raw_resp)
+    # Start building filters for the databases the agent is most likely to
+    # pick while it is still deciding, so the two LLM calls overlap.
+    speculative: Dict[str, asyncio.Task] = {}
+    if SPECULATION_WIDTH > 0:
+        for dbid in rank_databases(query, tool_data)[:SPECULATION_WIDTH]:
+            task = asyncio.create_task(build_db_filter(
+                query,
+                _schema_for(tool_data, dbid),
+                filter_guide,
+                dbid,
+                db_instructions,
+            ))
+            # Discarded tasks may fail unobserved; retrieve the error to keep asyncio quiet.
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            speculative[dbid] = task
+        SPECULATION_STATS["speculated"] += len(speculative)
+
+    try:
+        # Ask the LLM which pages and databases are relevant.
+        agent_out = await run_search_agent(query, tool_data)
 
-    return {"pages": pages, "databases": databases}
+        for dbid, task in speculative.items():
+            if dbid in agent_out.database_ids:
+                SPECULATION_STATS["used"] += 1
+            else:
+                SPECULATION_STATS["wasted"] += 1
+                if not task.done():
+                    SPECULATION_STATS["cancelled"] += 1
+                    task.cancel()
+
+        # Results will contain already-simplified text/values rather than the raw
+        # Notion API payloads so that callers can work with them directly.
+        pages: Dict[str, str] = {}
+        databases: Dict[str, List[Dict[str, Any]] | Dict[str, Any]] = {}
+
+        # Pages covered by the index are answered with ranked snippets; anything
+        # else (or everything, when requested) is fetched live in full.
+        live_page_ids = list(agent_out.page_ids)
+        if page_index is not None and not fetch_pages:
+            indexed = [pid for pid in agent_out.page_ids if pid in page_index]
+            with span("page_index.search", pages=len(indexed)):
+                matches = page_index.search(query, indexed)
+            for pid, snippets in matches.items():
+                pages[pid] = "\n".join(s["text"] for s in snippets)
+            # Selected pages without any text still appear, just empty.
+            for pid in indexed:
+                pages.setdefault(pid, "")
+            live_page_ids = [pid for pid in agent_out.page_ids if pid not in page_index]
+
+        for pid in live_page_ids:
+            blocks = await fetch_page_blocks(notion, pid)
+            pages[pid] = _blocks_to_text(blocks)
+
+        if max_page_chars is not None:
+            pages = {pid: text[:max_page_chars] for pid, text in pages.items()}
+
+        # For databases we need an additional step: build a filter so that the
+        # resulting query only returns rows that match the user's intent.
+        for dbid in agent_out.database_ids:
+            schema_json = _schema_for(tool_data, dbid)
+
+            if dbid in speculative:
+                filter_obj = await speculative[dbid]
+            else:
+                filter_obj = await build_db_filter(
+                    query,
+                    schema_json,
+                    filter_guide,
+                    dbid,
+                    db_instructions,
+                )
+            projection = (properties or {}).get(dbid)
+            rows = None
+            if mirror is not None:
+                with span("mirror.query", database_id=dbid):
+                    rows = mirror.query(dbid, schema_json, filter_obj["filter"], projection, max_rows)
+            if rows is not None:
+                databases[dbid] = _rows_to_columns(rows) if columnar else rows
+                continue
+
+            query_kwargs: Dict[str, Any] = {"database_id": dbid, "filter": filter_obj["filter"]}
+            if max_rows is not None:
+                query_kwargs["page_size"] = min(max_rows, 100)
+            if projection is not None:
+                # Let Notion drop the unwanted properties before they are sent.
+                schema = json.loads(schema_json)
+                query_kwargs["filter_properties"] = [schema[n]["id"] for n in projection if "id" in schema.get(n, {})]
+            raw_resp = query_cache.get(notion, query_kwargs) if query_cache is not None else None
+            if raw_resp is None:
+                with span("notion.databases.query", database_id=dbid):
+                    raw_resp = await within_deadline(notion.databases.query(**query_kwargs))
+                if query_cache is not None:
+                    query_cache.put(notion, query_kwargs, raw_resp)
+            with span("simplify", database_id=dbid, rows=len(raw_resp.get("results", []))):
+                databases[dbid] = _simplify_database_query(raw_resp, schema_json, columnar, projection)
+
+        return {"pages": pages, "databases": databases}
+    finally:
+        # Speculative filters still running when the search fails are not needed any more.
+        for task in speculative.values():
+            task.cancel()
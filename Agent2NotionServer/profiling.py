@@ -0,0 +1,202 @@
+"""Opt-in per-request profiling.
+
+A profiled request records a span trace (LLM calls, Notion calls, CPU-bound
+steps wrapped in ``span``) and a statistical profile of the event loop
+thread, sampled every ``NOTION_PROFILE_INTERVAL_MS``. Finished profiles are
+kept in a bounded ring buffer. Requests are profiled when they carry the
+admin key in the ``X-Profile`` header or are picked by
+``NOTION_PROFILE_SAMPLE_RATE``.
+
+When a request is not profiled ``span`` returns a shared no-op context
+manager after a single context variable lookup, and the sampler thread is
+not running.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import itertools
+import threading
+from collections import Counter, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = float(os.getenv("NOTION_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_BUFFER_SIZE = int(os.getenv("NOTION_PROFILE_BUFFER_SIZE", "50"))
+PROFILE_INTERVAL = int(os.getenv("NOTION_PROFILE_INTERVAL_MS", "5")) / 1000
+# Deepest stack and number of distinct stacks kept per profile.
+_MAX_STACK_DEPTH = 64
+_MAX_STACKS = 200
+
+_current: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+_parent_span: ContextVar[int | None] = ContextVar("profile_span", default=None)
+_NOOP = nullcontext()
+
+# Finished profiles, oldest first.
+PROFILES: Deque["Profile"] = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+
+class Profile:
+    """Spans and stack samples recorded for one request."""
+
+    def __init__(self, path: str, thread_id: int) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration_ms: float | None = None
+        self.spans: List[Dict[str, Any]] = []
+        self.samples: Counter = Counter()
+        self._span_ids = itertools.count()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": len(self.spans),
+            "samples": sum(self.samples.values()),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+            "samples": [{"stack": stack, "count": count} for stack, count in self.samples.most_common(_MAX_STACKS)],
+        }
+
+
+class _Span:
+    __slots__ = ("profile", "name", "attrs", "record", "start", "token")
+
+    def __init__(self, profile: Profile, name: str, attrs: Dict[str, Any]) -> None:
+        self.profile = profile
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+        self.record = {
+            "id": next(self.profile._span_ids),
+            "parent": _parent_span.get(),
+            "name": self.name,
+            "start_ms": round((self.start - self.profile.start) * 1000, 3),
+            "duration_ms": None,
+            **self.attrs,
+        }
+        # Spans may be recorded from worker threads too; list.append is atomic.
+        self.profile.spans.append(self.record)
+        self.token = _parent_span.set(self.record["id"])
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _parent_span.reset(self.token)
+        self.record["duration_ms"] = round((time.perf_counter() - self.start) * 1000, 3)
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+
+
+def span(name: str, **attrs: Any):
+    """Context manager recording ``name`` as a span of the current request's profile, if any."""
+    profile = _current.get()
+    if profile is None:
+        return _NOOP
+    return _Span(profile, name, attrs)
+
+
+class _Sampler:
+    """Background thread sampling the stacks of the threads with an active profile."""
+
+    def __init__(self) -> None:
+        self.active: List[Profile] = []
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    def add(self, profile: Profile) -> None:
+        with self.lock:
+            self.active.append(profile)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self.lock:
+            self.active.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                profiles = list(self.active)
+            frames = sys._current_frames()
+            for thread_id in {p.thread_id for p in profiles}:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < _MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                for profile in profiles:
+                    if profile.thread_id == thread_id:
+                        profile.samples[folded] += 1
+            time.sleep(PROFILE_INTERVAL)
+
+
+_sampler = _Sampler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying ``token`` in ``X-Profile`` or picked by sampling.
+
+    The profile id is returned in the ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app, token: str | None = None, sample_rate: float = PROFILE_SAMPLE_RATE) -> None:
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+
+    def _wanted(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return value == self.token
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["path"], threading.get_ident())
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        _sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _sampler.remove(profile)
+            _current.reset(token)
+            profile.duration_ms = round((time.perf_counter() - profile.start) * 1000, 3)
+            PROFILES.append(profile)
+            logger.info("Profiled %s in %.1f ms (profile %s)", profile.path, profile.duration_ms, profile.id)
+
+
+def get_profile(profile_id: str) -> Profile | None:
+    return next((p for p in PROFILES if p.id == profile_id), None)
@@ -0,0 +1,132 @@
+"""Shared cache of database query results, kept warm for hot queries.
+
+``/search-notion`` traffic is dominated by a few (database, filter) pairs.
+Every live ``databases.query`` made by a search is recorded here; the ones
+asked for at least ``NOTION_QUERY_CACHE_HOT_HITS`` times recently are
+re-run in the background every ``NOTION_QUERY_CACHE_WARM_INTERVAL`` seconds,
+at most ``NOTION_QUERY_CACHE_WARM_RATE`` requests per second. Searches are
+answered from the cache while an entry is younger than
+``NOTION_QUERY_CACHE_TTL`` seconds.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from notion_client import AsyncClient
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+QUERY_CACHE_TTL = float(os.getenv("NOTION_QUERY_CACHE_TTL", "60"))
+QUERY_CACHE_SIZE = int(os.getenv("NOTION_QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_HOT_HITS = int(os.getenv("NOTION_QUERY_CACHE_HOT_HITS", "3"))
+QUERY_CACHE_WARM_INTERVAL = float(os.getenv("NOTION_QUERY_CACHE_WARM_INTERVAL", "30"))
+QUERY_CACHE_WARM_RATE = float(os.getenv("NOTION_QUERY_CACHE_WARM_RATE", "1"))
+
+
+class _Entry:
+    __slots__ = ("notion", "query_kwargs", "response", "fetched", "hits")
+
+    def __init__(self, notion: AsyncClient, query_kwargs: Dict[str, Any]) -> None:
+        self.notion = notion
+        self.query_kwargs = query_kwargs
+        self.response: Dict[str, Any] | None = None
+        self.fetched = 0.0
+        self.hits = 0.0
+
+
+class QueryCache:
+    """LRU of ``databases.query`` responses keyed by their query arguments.
+
+    ``hits`` per entry decay by half after every warming pass, so an entry
+    stays hot only while it keeps being asked for.
+    """
+
+    def __init__(
+        self,
+        ttl: float = QUERY_CACHE_TTL,
+        max_entries: int = QUERY_CACHE_SIZE,
+        hot_hits: int = QUERY_CACHE_HOT_HITS,
+        warm_rate: float = QUERY_CACHE_WARM_RATE,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hot_hits = hot_hits
+        self.warm_rate = warm_rate
+        self.stats = {"hits": 0, "misses": 0, "warmed": 0, "warm_errors": 0}
+        self._entries: "OrderedDict[Tuple[int, str], _Entry]" = OrderedDict()
+
+    @staticmethod
+    def _key(notion: AsyncClient, query_kwargs: Dict[str, Any]) -> Tuple[int, str]:
+        # The client identifies the workspace, since catalogs are per tenant.
+        return id(notion), json.dumps(query_kwargs, sort_keys=True)
+
+    def get(self, notion: AsyncClient, query_kwargs: Dict[str, Any]) -> Dict[str, Any] | None:
+        """Return a fresh cached response for the query, recording the request either way."""
+        key = self._key(notion, query_kwargs)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(notion, query_kwargs)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        entry.hits += 1
+        if entry.response is not None and time.monotonic() - entry.fetched <= self.ttl:
+            self.stats["hits"] += 1
+            return entry.response
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, notion: AsyncClient, query_kwargs: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Store the response of a live query recorded with ``get``."""
+        entry = self._entries.get(self._key(notion, query_kwargs))
+        if entry is not None:
+            entry.response = response
+            entry.fetched = time.monotonic()
+
+    def invalidate(self, notion: AsyncClient) -> None:
+        """Forget the cached responses of one workspace after it was written to; hit counts are kept."""
+        for entry in self._entries.values():
+            if entry.notion is notion:
+                entry.response = None
+
+    def hot(self) -> List[_Entry]:
+        """Entries asked for often enough to keep warm, hottest first."""
+        return sorted((e for e in self._entries.values() if e.hits >= self.hot_hits), key=lambda e: -e.hits)
+
+    async def warm(self) -> int:
+        """Re-run the hot queries, paced to ``warm_rate`` requests per second; return how many were refreshed."""
+        warmed = 0
+        for sent, entry in enumerate(self.hot()):
+            if sent:
+                await asyncio.sleep(1 / self.warm_rate)
+            try:
+                response = await entry.notion.databases.query(**entry.query_kwargs)
+            except Exception as e:
+                # Typically the tenant was evicted and its client closed.
+                self.stats["warm_errors"] += 1
+                logger.info("Dropping cached query for %s: %s", entry.query_kwargs.get("database_id"), e)
+                self._entries.pop(self._key(entry.notion, entry.query_kwargs), None)
+                continue
+            entry.response = response
+            entry.fetched = time.monotonic()
+            warmed += 1
+        for entry in self._entries.values():
+            entry.hits /= 2
+        self.stats["warmed"] += warmed
+        return warmed
+
+    async def run_warm_loop(self, interval: float = QUERY_CACHE_WARM_INTERVAL) -> None:
+        """Warm the hot queries every ``interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            warmed = await self.warm()
+            if warmed:
+                logger.info("Warmed %d hot database queries", warmed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "hot": len(self.hot())}
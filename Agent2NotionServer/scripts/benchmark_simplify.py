@@ -0,0 +1,53 @@
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+
+# Add the parent directory (Agent2NotionServer) to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_tools import _simplify_database_query
+from tests.simplify_fixtures import SCHEMA, make_payload, per_cell
+
+
+def _timed(func) -> float:
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark database row simplification")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    resp = make_payload(args.rows)
+    schema_json = json.dumps(SCHEMA)
+    assert per_cell(resp) == _simplify_database_query(resp, schema_json)
+
+    variants = {
+        "per-cell dispatch": lambda: per_cell(resp),
+        "compiled extractor": lambda: _simplify_database_query(resp, schema_json),
+        "compiled, columnar": lambda: _simplify_database_query(resp, schema_json, True),
+    }
+    # Run the variants in turns and keep each one's best time, so that load
+    # on the machine affects all of them alike.
+    best = dict.fromkeys(variants, float("inf"))
+    for _ in range(args.repeat):
+        for label, func in variants.items():
+            best[label] = min(best[label], _timed(func))
+    for label, seconds in best.items():
+        print(f"{label:<24} {seconds * 1000:8.2f} ms")
+    baseline = best["per-cell dispatch"]
+    print(
+        f"speedup: {baseline / best['compiled extractor']:.2f}x rows, "
+        f"{baseline / best['compiled, columnar']:.2f}x columnar"
+    )
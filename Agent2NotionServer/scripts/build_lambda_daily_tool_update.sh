@@ -22,6 +22,12 @@ cp Agent2NotionServer/scripts/${FUNC_NAME} "${BUILD_DIR}/"
 
 # include any local packages that the function imports (e.g. notion_tools)
 cp -r Agent2NotionServer/notion_tools.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/notion_index.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/notion_markdown.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/singleflight.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/deadlines.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/hedging.py "${BUILD_DIR}/"
+cp -r Agent2NotionServer/profiling.py "${BUILD_DIR}/"
 mkdir -p "${BUILD_DIR}/scripts"
 
 echo "· Zipping"
@@ -10,24 +10,23 @@ import boto3
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from notion_tools import generate_tool_metadata_json
+from notion_tools import generate_and_cache_tool_metadata
+from notion_index import PAGE_INDEX_KEY
 
 logger = logging.getLogger(__name__)
 
-DATA_FILE = Path(__file__).resolve().parent.parent / "notion_tools_data.json"
+# Lambda's writable scratch space. Metadata is streamed to disk as NDJSON so
+# memory does not grow with the size of the workspace.
+DATA_FILE = Path("/tmp/notion_tools_data.ndjson")
+INDEX_FILE = Path("/tmp") / PAGE_INDEX_KEY
 
 
-def upload_json_to_s3(json_str: str, bucket: str, key: str) -> None:
-    """Upload the JSON payload directly to S3 without touching disk."""
+def upload_file_to_s3(file_path: Path, bucket: str, key: str, content_type: str) -> None:
+    """Upload a generated file to S3."""
     s3 = boto3.client("s3")
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=json_str.encode("utf-8"),
-        ContentType="application/json",
-    )
+    s3.upload_file(str(file_path), bucket, key, ExtraArgs={"ContentType": content_type})
     logging.getLogger(__name__).info("Uploaded %s bytes to s3://%s/%s",
-                                     len(json_str), bucket, key)
+                                     file_path.stat().st_size, bucket, key)
 
 
 def lambda_handler(event, context):
@@ -46,8 +45,9 @@ def lambda_handler(event, context):
         logger.error("Missing required environment variables")
         return {"status": "error"}
 
-    metadata_json = asyncio.run(generate_tool_metadata_json())
-    upload_json_to_s3(metadata_json, bucket, key)
+    asyncio.run(generate_and_cache_tool_metadata(str(DATA_FILE), str(INDEX_FILE)))
+    upload_file_to_s3(DATA_FILE, bucket, key, "application/x-ndjson")
+    upload_file_to_s3(INDEX_FILE, bucket, PAGE_INDEX_KEY, "application/json")
 
     eb = boto3.client("elasticbeanstalk")
     eb.restart_app_server(EnvironmentName=eb_env)
@@ -14,9 +14,11 @@ logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(name)s: %(messa
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from notion_tools import generate_and_cache_tool_metadata
+from notion_index import PAGE_INDEX_KEY
 
 
 DATA_FILE = Path(__file__).resolve().parent.parent / "notion_tools_data.json"
+INDEX_FILE = Path(__file__).resolve().parent.parent / PAGE_INDEX_KEY
 
 
 def upload_to_s3(file_path: str, bucket: str, key: str) -> None:
@@ -38,7 +40,8 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    asyncio.run(generate_and_cache_tool_metadata(str(DATA_FILE)))
+    asyncio.run(generate_and_cache_tool_metadata(str(DATA_FILE), str(INDEX_FILE)))
 
     if args.bucket:
         upload_to_s3(str(DATA_FILE), args.bucket, args.key)
+        upload_to_s3(str(INDEX_FILE), args.bucket, PAGE_INDEX_KEY)
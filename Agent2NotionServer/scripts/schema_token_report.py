@@ -0,0 +1,42 @@
+import os
+import sys
+import logging
+from typing import Callable
+
+# Add the parent directory (Agent2NotionServer) to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_tools import OPENAI_MODEL, compact_schema, estimate_tokens, load_tool_data_from_env
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def token_counter() -> tuple[Callable[[str], int], str]:
+    """Return a token counting function, using tiktoken when its encoding is available."""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except KeyError:  # Model unknown to this tiktoken version
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.info("tiktoken unavailable (%s); estimating ~4 characters per token", e)
+        return estimate_tokens, "estimated"
+    return lambda text: len(encoding.encode(text)), encoding.name
+
+
+if __name__ == "__main__":
+    count, method = token_counter()
+    total_raw = total_compact = 0
+    print(f"{'database':<40} {'raw':>8} {'compact':>8} {'saved':>6}   ({method} tokens)")
+    for item in load_tool_data_from_env():
+        if item.get("type") != "database":
+            continue
+        raw = count(item.get("schema") or "{}")
+        compact = count(compact_schema(item.get("schema") or "{}"))
+        total_raw += raw
+        total_compact += compact
+        print(f"{item.get('title', 'Untitled')[:40]:<40} {raw:>8} {compact:>8} {1 - compact / raw:>6.0%}")
+    if total_raw:
+        print(f"{'total':<40} {total_raw:>8} {total_compact:>8} {1 - total_compact / total_raw:>6.0%}")
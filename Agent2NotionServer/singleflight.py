@@ -0,0 +1,95 @@
+"""In-process coalescing of identical concurrent async calls.
+
+Concurrent callers that ask a ``SingleFlight`` group for the same key share
+one in-flight coroutine and all receive its result (or exception). Once the
+call finishes the key is forgotten, so later callers start fresh work; this is
+not a cache.
+"""
+import asyncio
+import functools
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from deadlines import SharedDeadline, within_deadline
+
+T = TypeVar("T")
+
+# Every group created in the process, by name, so their stats can be reported.
+_GROUPS: Dict[str, "SingleFlight"] = {}
+
+
+class _Call:
+    __slots__ = ("task", "deadline", "waiters")
+
+    def __init__(self, task: asyncio.Task, deadline: SharedDeadline) -> None:
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one in-flight coroutine between concurrent callers with the same key.
+
+    The shared work runs as its own task, so a caller being cancelled does not
+    cancel it for the others. It is only cancelled once every caller waiting
+    on it has gone away. The task runs under the latest deadline of its
+    callers (``SharedDeadline``); each caller stops waiting at its own.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stats = {"calls": 0, "coalesced": 0}
+        self._calls: Dict[Hashable, _Call] = {}
+        _GROUPS[name] = self
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of ``func()``, sharing it with concurrent callers of ``key``."""
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            shared = SharedDeadline()
+            call = _Call(shared.start(func()), shared)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.stats["coalesced"] += 1
+            # The shared work may run for as long as its most patient caller waits.
+            call.deadline.join()
+
+        call.waiters += 1
+        try:
+            # Each caller waits only until its own deadline.
+            return await within_deadline(asyncio.shield(call.task))
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+
+def singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """Return call/coalesced counters (and the coalescing rate) for every group."""
+    return {
+        name: {**group.stats, "coalesced_rate": group.stats["coalesced"] / group.stats["calls"] if group.stats["calls"] else 0.0}
+        for name, group in _GROUPS.items()
+    }
+
+
+def coalesce(group: SingleFlight, key: Callable[[Dict[str, Any]], Hashable]):
+    """Decorate an async function so concurrent calls with equal keys share one call.
+
+    ``key`` receives the call's bound arguments (defaults applied) by name.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return await group.do(key(bound.arguments), lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,241 @@
+"""Per-tenant Notion workspaces behind one server.
+
+Each API key maps to a ``TenantConfig`` naming the tenant's Notion token and
+where its catalog, DB instructions and page index live. The loaded state —
+catalog, pooled Notion client and lazily compiled agent graph — is kept in a
+bounded LRU so memory stays capped however many tenants are configured.
+"""
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List
+
+from notion_client import AsyncClient
+
+from notion_tools import load_tool_data, load_db_instructions
+from notion_index import PageIndex, load_page_index
+from singleflight import SingleFlight
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+TENANT_CACHE_SIZE = int(os.getenv("NOTION_TENANT_CACHE_SIZE", "8"))
+
+DEFAULT_TENANT = "default"
+
+_load_flight = SingleFlight("tenant_load")
+
+
+@dataclass
+class TenantConfig:
+    """Where a tenant's token and catalog files come from.
+
+    The ``*_path`` fields are local overrides; otherwise each file is loaded
+    from the tool data bucket under ``*_key``. Keys of non-default tenants
+    default to ``<name>/<file>`` so each tenant gets its own prefix.
+    """
+
+    name: str
+    notion_token: str | None = None
+    tool_data_path: str | None = None
+    tool_data_key: str | None = None
+    db_instructions_path: str | None = None
+    db_instructions_key: str | None = None
+    page_index_path: str | None = None
+    page_index_key: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.name == DEFAULT_TENANT:
+            return
+        self.tool_data_key = self.tool_data_key or f"{self.name}/notion_tools_data.json"
+        self.db_instructions_key = self.db_instructions_key or f"{self.name}/db_custom_instructions.json"
+        self.page_index_key = self.page_index_key or f"{self.name}/notion_page_index.json"
+
+
+class Tenant:
+    """A tenant's loaded catalog and pooled Notion client."""
+
+    def __init__(
+        self,
+        config: TenantConfig,
+        tool_data: List[Dict[str, Any]],
+        db_instructions: Dict[str, str],
+        page_index: PageIndex | None,
+    ) -> None:
+        self.config = config
+        self.tool_data = tool_data
+        self.db_instructions = db_instructions
+        self.page_index = page_index
+        self.notion = AsyncClient(auth=config.notion_token)
+        # Requests currently using this tenant; an evicted tenant's client is
+        # only closed once this drops to zero.
+        self.active = 0
+        self.evicted = False
+        self._agent = None
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def agent(self):
+        """The tenant's add-to-notion graph, compiled on first use."""
+        if self._agent is None:
+            # Imported here so the registry does not pull in LangGraph until needed
+            from notion_agent import NotionAgent
+            self._agent = NotionAgent(self.tool_data, self.notion)
+        return self._agent
+
+    async def aclose(self) -> None:
+        await self.notion.aclose()
+
+
+def _load_tenant(config: TenantConfig) -> Tenant:
+    tool_data = load_tool_data(config.tool_data_path, config.tool_data_key)
+    if not tool_data:
+        raise ValueError(f"No tool data found for tenant {config.name}")
+    db_instructions = load_db_instructions(config.db_instructions_path, config.db_instructions_key)
+    page_index = load_page_index(config.page_index_path, config.page_index_key)
+    logger.info("Loaded tenant %s with %d catalog items", config.name, len(tool_data))
+    return Tenant(config, tool_data, db_instructions, page_index)
+
+
+class TenantRegistry:
+    """Resolve API keys to tenants, loading catalogs on demand.
+
+    At most ``capacity`` tenants stay loaded; the least recently used one is
+    evicted when another has to be loaded. Concurrent first requests for the
+    same tenant share a single load. A tenant is only closed once no request
+    uses it and no caller is still waiting for it to load.
+    """
+
+    def __init__(self, configs: Dict[str, TenantConfig], capacity: int = TENANT_CACHE_SIZE) -> None:
+        self.configs = configs
+        self.capacity = max(1, capacity)
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        # Callers waiting on a load, by tenant name, and tenants evicted while
+        # only such callers held them.
+        self._waiting: Dict[str, int] = {}
+        self._draining: Dict[str, Tenant] = {}
+
+    def config_for(self, api_key: str | None) -> TenantConfig | None:
+        return self.configs.get(api_key) if api_key else None
+
+    def loaded(self) -> List[Tenant]:
+        """Tenants currently held in memory, least recently used first."""
+        return list(self._tenants.values())
+
+    async def _pin(self, config: TenantConfig) -> Tenant:
+        """Return the tenant for ``config`` with a reference taken, loading it if needed.
+
+        The reference is taken in the same step the tenant is handed out, so
+        a concurrent eviction cannot close it in between.
+        """
+        tenant = self._tenants.get(config.name)
+        if tenant is not None:
+            self.stats["hits"] += 1
+            self._tenants.move_to_end(config.name)
+            tenant.active += 1
+            return tenant
+
+        self._waiting[config.name] = self._waiting.get(config.name, 0) + 1
+        try:
+            tenant = await _load_flight.do(config.name, lambda: self._load(config))
+        except BaseException:
+            self._stop_waiting(config.name)
+            raise
+        tenant.active += 1
+        self._stop_waiting(config.name)
+        return tenant
+
+    def _stop_waiting(self, name: str) -> None:
+        self._waiting[name] -= 1
+        if self._waiting[name]:
+            return
+        del self._waiting[name]
+        # The last waiter is gone; an evicted tenant nobody took up can be closed now.
+        tenant = self._draining.pop(name, None)
+        if tenant is not None and tenant.active == 0:
+            asyncio.ensure_future(tenant.aclose())
+
+    async def _release(self, tenant: Tenant) -> None:
+        tenant.active -= 1
+        if tenant.evicted and tenant.active == 0 and self._draining.get(tenant.name) is not tenant:
+            await tenant.aclose()
+
+    async def _load(self, config: TenantConfig) -> Tenant:
+        tenant = await asyncio.to_thread(_load_tenant, config)
+        self.stats["loads"] += 1
+        self._tenants[config.name] = tenant
+        to_close = []
+        while len(self._tenants) > self.capacity:
+            _, evicted = self._tenants.popitem(last=False)
+            self.stats["evictions"] += 1
+            evicted.evicted = True
+            logger.info("Evicted tenant %s", evicted.name)
+            if self._waiting.get(evicted.name):
+                # Loaded for callers that have not picked it up yet.
+                self._draining[evicted.name] = evicted
+            elif evicted.active == 0:
+                to_close.append(evicted)
+        for evicted in to_close:
+            await evicted.aclose()
+        return tenant
+
+    @asynccontextmanager
+    async def acquire(self, config: TenantConfig) -> AsyncIterator[Tenant]:
+        """Use a tenant for the duration of a request.
+
+        Its client stays open until the request finishes, even if the tenant
+        is evicted in the meantime.
+        """
+        tenant = await self._pin(config)
+        try:
+            yield tenant
+        finally:
+            await self._release(tenant)
+
+    async def aclose(self) -> None:
+        for tenant in self._tenants.values():
+            await tenant.aclose()
+        self._tenants.clear()
+
+
+def load_tenant_configs_from_env() -> Dict[str, TenantConfig]:
+    """Map API keys to tenant configs.
+
+    ``NOTION_TENANTS_PATH`` points to a JSON object keyed by API key whose
+    values are ``TenantConfig`` fields (``name`` required). A tenant may give
+    ``notion_token_env`` to read its token from another environment variable.
+    Without it a single default tenant is served for ``API_KEY`` using
+    ``NOTION_TOKEN`` and the usual ``NOTION_*_PATH`` overrides.
+    """
+    tenants_path = os.getenv("NOTION_TENANTS_PATH")
+    if tenants_path:
+        with open(tenants_path, "r") as f:
+            raw = json.load(f)
+        configs = {}
+        for api_key, fields in raw.items():
+            fields = dict(fields)
+            token_env = fields.pop("notion_token_env", None)
+            if token_env:
+                fields["notion_token"] = os.getenv(token_env)
+            configs[api_key] = TenantConfig(**fields)
+        return configs
+
+    api_key = os.getenv("API_KEY")
+    if not api_key:
+        return {}
+    return {
+        api_key: TenantConfig(
+            name=DEFAULT_TENANT,
+            notion_token=os.getenv("NOTION_TOKEN"),
+            tool_data_path=os.getenv("NOTION_TOOL_DATA_PATH"),
+            db_instructions_path=os.getenv("NOTION_DB_INSTRUCTIONS_PATH"),
+            page_index_path=os.getenv("NOTION_PAGE_INDEX_PATH"),
+        )
+    }
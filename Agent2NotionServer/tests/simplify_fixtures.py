@@ -0,0 +1,43 @@
+"""Database query payloads shared by the simplification tests and benchmark."""
+from notion_tools import _extract_property_value
+
+SCHEMA = {
+    "Name": {"id": "title", "type": "title"},
+    "Notes": {"id": "nt", "type": "rich_text"},
+    "Status": {"id": "st", "type": "status"},
+    "Priority": {"id": "pr", "type": "select"},
+    "Tags": {"id": "tg", "type": "multi_select"},
+    "Estimate": {"id": "es", "type": "number"},
+    "Done": {"id": "dn", "type": "checkbox"},
+    "Due": {"id": "du", "type": "date"},
+    "Link": {"id": "ln", "type": "url"},
+}
+
+
+def make_payload(rows: int) -> dict:
+    """Build a databases.query-shaped response with ``rows`` results."""
+    results = []
+    for i in range(rows):
+        results.append({
+            "id": f"page-{i}",
+            "properties": {
+                "Name": {"type": "title", "title": [{"plain_text": f"Task {i}"}]},
+                "Notes": {"type": "rich_text", "rich_text": [{"plain_text": "Some "}, {"plain_text": "notes"}]},
+                "Status": {"type": "status", "status": {"name": "In progress"}},
+                "Priority": {"type": "select", "select": {"name": "High"} if i % 2 else None},
+                "Tags": {"type": "multi_select", "multi_select": [{"name": "Work"}, {"name": "Q2"}]},
+                "Estimate": {"type": "number", "number": i % 8},
+                "Done": {"type": "checkbox", "checkbox": bool(i % 3)},
+                "Due": {"type": "date", "date": {"start": "2024-05-01", "end": None}},
+                "Link": {"type": "url", "url": None},
+            },
+        })
+    return {"results": results, "has_more": False}
+
+
+def per_cell(resp: dict) -> list:
+    """The original implementation: dispatch on the property type for every cell."""
+    return [
+        {"id": page.get("id"), "properties": {n: _extract_property_value(v) for n, v in page.get("properties", {}).items()}}
+        for page in resp.get("results", [])
+    ]
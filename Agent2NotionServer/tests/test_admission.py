@@ -0,0 +1,115 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from admission import AdmissionController, AdmissionRejected, PRIORITY_INTERACTIVE, PRIORITY_SEARCH, PRIORITY_BATCH
+
+
+async def _hold(controller: AdmissionController, key: str, release: asyncio.Event, order: list,
+                cost: float = 1, priority: int = PRIORITY_INTERACTIVE) -> None:
+    async with controller.admit(key, cost, priority):
+        order.append(key)
+        await release.wait()
+
+
+def test_queued_requests_run_by_priority_and_skip_saturated_keys():
+    async def scenario():
+        controller = AdmissionController(capacity=2, key_concurrency=1, budget=100, refill=1, queue_size=10, timeout=5)
+        release, order = asyncio.Event(), []
+        running = asyncio.create_task(_hold(controller, "heavy", release, order, priority=PRIORITY_SEARCH))
+        await asyncio.sleep(0)
+        # "heavy" is at its concurrency limit, so its next search waits while
+        # the interactive request from another key takes the free slot.
+        queued = asyncio.create_task(_hold(controller, "heavy", release, order, priority=PRIORITY_SEARCH))
+        interactive = asyncio.create_task(_hold(controller, "light", release, order))
+        await asyncio.sleep(0.01)
+        assert order == ["heavy", "light"]
+        assert controller.snapshot()["queue_depth"] == 1
+
+        release.set()
+        await asyncio.gather(running, queued, interactive)
+        return controller.snapshot(), order
+
+    snapshot, order = asyncio.run(scenario())
+    assert order == ["heavy", "light", "heavy"]
+    assert snapshot["admitted"] == 3 and snapshot["queued"] == 1
+    assert snapshot["active"] == 0 and snapshot["queue_depth"] == 0
+
+
+def test_budget_refills_before_admitting():
+    async def scenario():
+        controller = AdmissionController(capacity=4, key_concurrency=4, budget=5, refill=100, queue_size=10, timeout=1)
+        release, order = asyncio.Event(), []
+        release.set()
+        await _hold(controller, "k", release, order, cost=5)
+        # The budget is spent; the next request waits ~50ms for it to refill.
+        await _hold(controller, "k", release, order, cost=5)
+        return controller.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["admitted"] == 2 and snapshot["queued"] == 1
+    assert snapshot["wait_max"] > 0
+
+
+def test_rejects_when_queue_full_over_budget_or_timed_out():
+    async def scenario():
+        controller = AdmissionController(capacity=1, key_concurrency=1, budget=10, refill=0.1, queue_size=1, timeout=0.05)
+        release, order = asyncio.Event(), []
+        running = asyncio.create_task(_hold(controller, "a", release, order))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_hold(controller, "b", release, order))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected) as full:
+            await _hold(controller, "c", release, order)
+        with pytest.raises(AdmissionRejected) as timeout:
+            await waiting
+        controller._bucket("a").tokens = 0
+        with pytest.raises(AdmissionRejected) as over_budget:
+            await _hold(controller, "a", release, order, cost=5)
+
+        release.set()
+        await running
+        return controller.snapshot(), [full.value.reason, timeout.value.reason, over_budget.value.reason]
+
+    snapshot, reasons = asyncio.run(scenario())
+    assert reasons == ["queue_full", "timeout", "over_budget"]
+    assert snapshot["active"] == 0 and snapshot["queue_depth"] == 0
+
+
+def test_batch_holds_one_slot_per_concurrent_write():
+    async def scenario():
+        controller = AdmissionController(capacity=4, key_concurrency=3, budget=20, refill=0, queue_size=10, timeout=0.05)
+        release, order = asyncio.Event(), []
+        # Asking for more slots than the key may use is clamped to its limit
+        batch = asyncio.create_task(_hold_slots(controller, "bulk", release, order, cost=200, slots=8))
+        await asyncio.sleep(0)
+        snapshot = controller.snapshot()
+        # The key's concurrency is used up by the batch; another key gets the last slot
+        with pytest.raises(AdmissionRejected) as rejected:
+            await _hold(controller, "bulk", release, order, cost=0)
+        other = asyncio.create_task(_hold(controller, "other", release, order))
+        await asyncio.sleep(0)
+        assert order == ["bulk", "other"]
+        release.set()
+        await asyncio.gather(batch, other)
+        return snapshot, rejected.value.reason, controller._bucket("bulk").tokens
+
+    snapshot, reason, tokens = asyncio.run(scenario())
+    assert snapshot["active"] == 3
+    assert reason == "timeout"
+    # A batch dearer than the budget is capped at the budget instead of going into debt
+    assert tokens == 0
+
+
+async def _hold_slots(controller: AdmissionController, key: str, release: asyncio.Event, order: list,
+                      cost: float, slots: int) -> None:
+    async with controller.admit(key, cost, PRIORITY_BATCH, slots=slots):
+        order.append(key)
+        await release.wait()
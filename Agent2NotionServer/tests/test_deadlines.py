@@ -0,0 +1,116 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from deadlines import DeadlineExceeded, deadline, remaining, within_deadline
+from singleflight import SingleFlight
+
+
+def test_deadline_is_inherited_by_tasks_and_cancels_calls():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        assert remaining() is None
+        with deadline(0.05):
+            with deadline(10):
+                # The tighter, enclosing deadline wins
+                assert remaining() <= 0.05
+            task = asyncio.create_task(within_deadline(slow()))
+            with pytest.raises(DeadlineExceeded):
+                await task
+        assert remaining() is None
+        assert await within_deadline(asyncio.sleep(0, "done")) == "done"
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+
+
+def test_coalesced_waiter_gives_up_at_its_own_deadline():
+    group = SingleFlight("test_deadline_flight")
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "result"
+
+    async def impatient():
+        with deadline(0.01):
+            return await group.do("key", work)
+
+    async def scenario():
+        patient = asyncio.create_task(group.do("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await impatient()
+        return await patient
+
+    assert asyncio.run(scenario()) == "result"
+
+
+def test_shared_work_is_not_bound_by_the_first_callers_deadline():
+    group = SingleFlight("test_two_deadlines_flight")
+
+    async def work():
+        # Outbound calls made by the shared work check the deadline it runs under
+        await within_deadline(asyncio.sleep(0.3))
+        return "result"
+
+    async def call(seconds: float):
+        with deadline(seconds):
+            return await group.do("key", work)
+
+    async def scenario():
+        first = asyncio.create_task(call(0.1))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(call(5))
+        with pytest.raises(DeadlineExceeded):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+
+
+def test_coalesced_search_passes_the_deadline_to_its_calls(monkeypatch):
+    import notion_tools
+    from notion_tools import SearchAgentOutput, search_notion_data
+
+    seen = {}
+
+    async def fake_agent(query, tool_data):
+        seen["agent"] = remaining()
+        return SearchAgentOutput(database_ids=["db-1"])
+
+    async def fake_filter(query, schema_json, guide_text, db_id, custom_instructions=None):
+        seen["filter"] = remaining()
+        return {"filter": {}}
+
+    class FakeDatabases:
+        async def query(self, **kwargs):
+            seen["query"] = remaining()
+            return {"results": []}
+
+    notion = type("FakeNotion", (), {"databases": FakeDatabases()})()
+    monkeypatch.setattr(notion_tools, "run_search_agent", fake_agent)
+    monkeypatch.setattr(notion_tools, "build_db_filter", fake_filter)
+
+    async def scenario():
+        with deadline(5):
+            await search_notion_data("tasks", notion, [{"id": "db-1", "type": "database", "schema": "{}"}], "guide", {})
+
+    asyncio.run(scenario())
+
+    assert set(seen) == {"agent", "filter", "query"}
+    assert all(left is not None and 0 < left <= 5 for left in seen.values())
+
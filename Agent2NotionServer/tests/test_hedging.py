@@ -0,0 +1,78 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from hedging import Hedger, hedge_stats
+
+
+def _warm(hedger: Hedger, latency: float, count: int) -> None:
+    hedger._latencies.extend([latency] * count)
+
+
+def test_slow_call_is_hedged_and_duplicate_wins():
+    hedger = Hedger("test_hedge_wins", percentile=0.9, min_samples=5)
+    _warm(hedger, 0.01, 5)
+    delays = [1.0, 0.0]
+    cancelled = []
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert asyncio.run(hedger.run(call)) == 0.0
+    assert cancelled == [1.0]
+    stats = hedge_stats()["test_hedge_wins"]
+    assert (stats["calls"], stats["hedged"], stats["hedge_wins"]) == (1, 1, 1)
+    assert stats["hedge_rate"] == 1.0 and stats["win_rate"] == 1.0
+
+
+def test_fast_calls_and_cold_hedgers_are_not_hedged():
+    hedger = Hedger("test_hedge_cold", percentile=0.9, min_samples=3)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def scenario():
+        for _ in range(4):
+            assert await hedger.run(call) == "ok"
+
+    asyncio.run(scenario())
+    assert len(calls) == 4
+    assert hedger.stats["hedged"] == 0
+    assert hedger.delay() is not None
+
+
+def test_failed_attempt_falls_back_to_the_other():
+    hedger = Hedger("test_hedge_failure", percentile=0.5, min_samples=1)
+    _warm(hedger, 0.0, 1)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("upstream error")
+        await asyncio.sleep(0.1)
+        return "second"
+
+    assert asyncio.run(hedger.run(call)) == "second"
+
+    async def always_fails():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(Hedger("test_hedge_down").run(always_fails))
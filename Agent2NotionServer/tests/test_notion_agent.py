@@ -0,0 +1,201 @@
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+os.environ.setdefault("OPENAI_API_KEY", "dummy-key")
+
+import notion_agent
+from notion_agent import NotionAgent
+
+CATALOG = [{"id": "db-1", "type": "database", "title": "Tasks", "summary": "Task list", "schema": "{}"}]
+
+
+class FakeLLM:
+    """Calls the Tasks tool on the first turn and answers in prose afterwards."""
+
+    def __init__(self, tool_name: str) -> None:
+        self.tool_name = tool_name
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.calls == 1:
+            return AIMessage(content="", tool_calls=[{
+                "name": self.tool_name,
+                "args": {"entry": {"properties": {"Name": {"title": [{"text": {"content": "Draft report"}}]}}}},
+                "id": "call-1",
+            }])
+        return AIMessage(content="Sorry, that did not work.")
+
+
+class FakePages:
+    def __init__(self, fail: bool) -> None:
+        self.fail = fail
+        self.created: list = []
+
+    async def create(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("validation_error")
+        self.created.append(kwargs)
+
+
+def _tool_for(agent: NotionAgent, title: str) -> str:
+    return next(t.name for t in agent.tools if (t.metadata or {}).get("notion_title") == title)
+
+
+def _run(fail: bool) -> tuple[str, FakeLLM, FakePages]:
+    pages = FakePages(fail)
+    agent = NotionAgent(CATALOG, type("FakeClient", (), {"pages": pages}))
+    llm = FakeLLM(_tool_for(agent, "Tasks"))
+    agent.llm_with_tools = llm
+    result = asyncio.run(agent.chain.ainvoke({"messages": [HumanMessage(content="Add a task")]}))
+    return result["messages"][-1].content, llm, pages
+
+
+def test_successful_tool_call_skips_second_llm_turn():
+    reply, llm, pages = _run(fail=False)
+
+    assert reply == "Created an entry in Tasks."
+    assert llm.calls == 1
+    assert pages.created[0]["parent"] == {"database_id": "db-1"}
+
+
+def test_failed_tool_call_returns_to_the_model():
+    reply, llm, _ = _run(fail=True)
+
+    assert reply == "Sorry, that did not work."
+    assert llm.calls == 2
+
+
+def test_fast_completion_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(notion_agent, "FAST_COMPLETION", False)
+
+    reply, llm, _ = _run(fail=False)
+
+    assert reply == "Sorry, that did not work."
+    assert llm.calls == 2
+
+
+class PlanningLLM:
+    """Creates a project and asks to continue, then adds a task once it has seen the result."""
+
+    def __init__(self, tool_name: str) -> None:
+        self.tool_name = tool_name
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        title = "Project" if self.calls == 1 else "Kickoff"
+        tool_calls = [{
+            "name": self.tool_name,
+            "args": {"entry": {"properties": {"Name": {"title": [{"text": {"content": title}}]}}}},
+            "id": f"call-{self.calls}",
+        }]
+        if self.calls == 1:
+            tool_calls.append({"name": "continue_plan", "args": {}, "id": "call-continue"})
+        return AIMessage(content="", tool_calls=tool_calls)
+
+
+def test_multi_step_plan_gets_a_second_turn():
+    pages = FakePages(fail=False)
+    agent = NotionAgent(CATALOG, type("FakeClient", (), {"pages": pages}))
+    llm = PlanningLLM(_tool_for(agent, "Tasks"))
+    agent.llm_with_tools = llm
+
+    result = asyncio.run(agent.chain.ainvoke({"messages": [HumanMessage(content="Add a project and its kickoff")]}))
+
+    assert [p["properties"]["Name"]["title"][0]["text"]["content"] for p in pages.created] == ["Project", "Kickoff"]
+    assert llm.calls == 2
+    assert result["messages"][-1].content == "Created an entry in Tasks."
+
+
+BATCH_CATALOG = CATALOG + [{"id": "page-1", "type": "page", "title": "Journal", "summary": "Daily notes"}]
+
+
+class RoutingLLM:
+    """Writes prompts starting with "note" to the Journal page and everything else to Tasks."""
+
+    def __init__(self, tools_by_title: dict) -> None:
+        self.tools_by_title = tools_by_title
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if not isinstance(messages[-1], HumanMessage):
+            return AIMessage(content="Sorry, that did not work.")
+        text = messages[-1].content
+        if text.startswith("note"):
+            name, args = self.tools_by_title["Journal"], {"text_input": {"text": text}}
+        else:
+            name, args = self.tools_by_title["Tasks"], {"entry": {"properties": {"Name": {"title": [{"text": {"content": text}}]}}}}
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call-{text}"}])
+
+
+class FakeBlocks:
+    def __init__(self) -> None:
+        self.children = self
+        self.appended: list = []
+
+    async def append(self, **kwargs):
+        await asyncio.sleep(0)
+        self.appended.append(kwargs["children"][0]["paragraph"]["rich_text"][0]["text"]["content"])
+
+
+class FailingPages(FakePages):
+    async def create(self, **kwargs):
+        if "broken" in str(kwargs):
+            raise RuntimeError("validation_error")
+        self.created.append(kwargs)
+
+
+def test_batch_groups_writes_and_reports_partial_failures(monkeypatch):
+    monkeypatch.setattr(notion_agent, "FAST_COMPLETION", True)
+    pages, blocks = FailingPages(False), FakeBlocks()
+    agent = NotionAgent(BATCH_CATALOG, type("FakeClient", (), {"pages": pages, "blocks": blocks}))
+    llm = RoutingLLM({t.metadata["notion_title"]: t.name for t in agent.tools if t.metadata})
+    agent.llm_with_tools = llm
+
+    prompts = ["note one", "task a", "note two", "broken", "note three"]
+    results = asyncio.run(agent.arun_batch(prompts, concurrency=3))
+
+    assert [r["ok"] for r in results] == [True, True, True, False, True]
+    assert results[0] == {"ok": True, "result": "Added text to Journal.", "error": None, "targets": ["Journal"]}
+    assert results[3]["targets"] == ["Tasks"] and results[3]["error"]
+    # Appends to the same page keep the prompts' order
+    assert blocks.appended == ["note one", "note two", "note three"]
+    assert len(pages.created) == 1
+    # One planning turn per prompt, plus a second turn only for the failed write
+    assert llm.calls == len(prompts) + 1
+
+
+class ConcurrentPages(FakePages):
+    def __init__(self) -> None:
+        super().__init__(fail=False)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        self.created.append(kwargs)
+
+
+def test_batch_creates_rows_in_one_database_concurrently():
+    pages = ConcurrentPages()
+    agent = NotionAgent(BATCH_CATALOG, type("FakeClient", (), {"pages": pages, "blocks": FakeBlocks()}))
+    agent.llm_with_tools = RoutingLLM({t.metadata["notion_title"]: t.name for t in agent.tools if t.metadata})
+
+    results = asyncio.run(agent.arun_batch([f"task {n}" for n in range(6)], concurrency=3))
+
+    assert all(r["ok"] for r in results)
+    assert len(pages.created) == 6
+    assert pages.max_in_flight == 3
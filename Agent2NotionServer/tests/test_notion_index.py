@@ -0,0 +1,67 @@
+import io
+import sys
+import json
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from notion_index import PageIndex, PageIndexWriter
+
+
+def _para(text: str) -> dict:
+    return {"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": text}]}}
+
+
+def _index() -> PageIndex:
+    index = PageIndex()
+    index.add_page("p1", [_para("Weekly sync with the design team"), _para("Budget review moved to Friday")])
+    index.add_page("p2", [_para("Budget budget budget"), {"type": "divider", "divider": {}}])
+    index.add_page("p3", [_para("Reading list")])
+    return index
+
+
+def test_search_ranks_pages_by_best_block():
+    results = _index().search("budget review")
+
+    assert list(results) == ["p1", "p2"]
+    assert results["p1"][0] == {"block": 1, "score": results["p1"][0]["score"], "text": "Budget review moved to Friday"}
+
+
+def test_search_restricted_to_page_ids_falls_back_to_lead_block():
+    results = _index().search("budget", page_ids=["p2", "p3"])
+
+    assert results == {
+        "p2": [{"block": 0, "score": results["p2"][0]["score"], "text": "Budget budget budget"}],
+        "p3": [{"block": 0, "score": 0.0, "text": "Reading list"}],
+    }
+
+
+def test_round_trips_through_json():
+    index = _index()
+    restored = PageIndex.from_json(index.to_json())
+
+    assert "p3" in restored
+    assert restored.search("design") == index.search("design")
+
+
+def test_writer_produces_the_same_index_on_disk():
+    pages = [
+        ("p1", [_para("Weekly sync with the design team"), _para("Budget review moved to Friday")]),
+        ("empty", []),
+        ("p2", [_para("Budget budget budget"), {"type": "divider", "divider": {}}]),
+        ("p3", [_para("Reading list")]),
+    ]
+    writer, expected = PageIndexWriter(), PageIndex()
+    for page_id, blocks in pages:
+        writer.add_page(page_id, blocks)
+        expected.add_page(page_id, blocks)
+    out = io.StringIO()
+    writer.write(out)
+    writer.close()
+
+    # Same JSON once reordered; only the order of the postings' tokens differs
+    assert json.loads(out.getvalue()) == json.loads(expected.to_json())
+    loaded = PageIndex.from_json(out.getvalue())
+    assert loaded.search("budget review") == expected.search("budget review")
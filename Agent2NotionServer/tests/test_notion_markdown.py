@@ -0,0 +1,125 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from notion_markdown import MAX_REQUEST_BYTES, MAX_TEXT_CHARS, append_blocks, chunk_blocks, markdown_to_blocks, rich_text
+
+
+def _plain(block: dict) -> str:
+    return "".join(rt["text"]["content"] for rt in block[block["type"]]["rich_text"])
+
+
+def test_markdown_structure_is_kept():
+    blocks = list(markdown_to_blocks(
+        "# Standup\n"
+        "Notes from today\n"
+        "spanning two lines\n"
+        "\n"
+        "- Ship **release**\n"
+        "- [x] Review PR\n"
+        "1. First\n"
+        "> Quote\n"
+        "---\n"
+        "```py\n"
+        "print('# not a heading')\n"
+        "```\n"
+    ))
+
+    assert [b["type"] for b in blocks] == [
+        "heading_1", "paragraph", "bulleted_list_item", "to_do", "numbered_list_item", "quote", "divider", "code",
+    ]
+    assert _plain(blocks[1]) == "Notes from today\nspanning two lines"
+    assert blocks[2]["bulleted_list_item"]["rich_text"][1] == {
+        "type": "text", "text": {"content": "release", "link": None}, "annotations": {"bold": True},
+    }
+    assert blocks[3]["to_do"]["checked"] is True
+    assert blocks[7]["code"]["language"] == "python"
+    assert _plain(blocks[7]) == "print('# not a heading')"
+
+
+def test_inline_links_and_code():
+    items = rich_text("see [docs](https://example.com) and `x = 1`")
+
+    assert items[1]["text"] == {"content": "docs", "link": {"url": "https://example.com"}}
+    assert items[3] == {"type": "text", "text": {"content": "x = 1", "link": None}, "annotations": {"code": True}}
+
+
+def test_only_absolute_urls_become_links():
+    text = "see [1](note), [top](#anchor) and [me](mailto:me@example.com)"
+    items = rich_text(text)
+
+    assert [item["text"]["content"] for item in items] == ["see [1](note), [top](#anchor) and ", "me"]
+    assert items[0]["text"]["link"] is None
+    assert items[1]["text"]["link"] == {"url": "mailto:me@example.com"}
+
+
+def test_long_text_is_split_at_notion_limits():
+    transcript = "word " * 100_000
+    blocks = list(markdown_to_blocks(transcript))
+
+    assert all(len(rt["text"]["content"]) <= MAX_TEXT_CHARS for b in blocks for rt in b["paragraph"]["rich_text"])
+    assert all(len(b["paragraph"]["rich_text"]) <= 100 for b in blocks)
+    assert "".join(_plain(b) for b in blocks) == transcript
+    assert len(blocks) == 3
+
+
+def test_append_blocks_sends_ordered_chunks_of_100():
+    class FakeBlocks:
+        def __init__(self) -> None:
+            self.children = self
+            self.calls: list = []
+
+        async def append(self, block_id, children):
+            self.calls.append((block_id, [_plain(c) for c in children]))
+
+    blocks = FakeBlocks()
+    notion = type("FakeClient", (), {"blocks": blocks})
+
+    calls = asyncio.run(append_blocks(notion, "page-1", markdown_to_blocks("\n".join(f"- item {i}" for i in range(250)))))
+
+    assert calls == 3
+    assert [len(children) for _, children in blocks.calls] == [100, 100, 50]
+    assert [c for _, children in blocks.calls for c in children] == [f"item {i}" for i in range(250)]
+    assert list(chunk_blocks([])) == []
+
+
+def test_chunks_are_sized_in_encoded_bytes():
+    # 100 paragraphs of 2000 CJK characters: 200k characters but ~600KB of UTF-8
+    blocks = list(markdown_to_blocks("\n\n".join("会议记录" * 500 for _ in range(100))))
+
+    chunks = list(chunk_blocks(blocks))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(json.dumps({"children": chunk}, ensure_ascii=False).encode("utf-8")) <= MAX_REQUEST_BYTES
+
+
+def test_next_chunk_is_built_while_the_previous_request_is_in_flight():
+    events = []
+
+    class SlowBlocks:
+        def __init__(self) -> None:
+            self.children = self
+
+        async def append(self, block_id, children):
+            events.append(("sent", _plain(children[0])))
+            await asyncio.sleep(0.01)
+
+    def source():
+        for i in range(3):
+            events.append(("built", f"item {i * 100}"))
+            yield from markdown_to_blocks("\n".join(f"- item {n}" for n in range(i * 100, (i + 1) * 100)))
+
+    asyncio.run(append_blocks(type("FakeClient", (), {"blocks": SlowBlocks()}), "page-1", source()))
+
+    # A chunk is complete once the first block of the next one arrives; its
+    # request goes out before any more blocks are pulled.
+    assert events == [
+        ("built", "item 0"), ("built", "item 100"), ("sent", "item 0"),
+        ("built", "item 200"), ("sent", "item 100"), ("sent", "item 200"),
+    ]
@@ -0,0 +1,173 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from notion_mirror import NotionMirror, UnsupportedFilterError, filter_to_sql, schema_columns
+
+
+SCHEMA = {
+    "Name": {"id": "title", "type": "title"},
+    "Status": {"id": "st", "type": "status"},
+    "Tags": {"id": "tg", "type": "multi_select"},
+    "Estimate": {"id": "es", "type": "number"},
+    "Done": {"id": "dn", "type": "checkbox"},
+    "Due": {"id": "du", "type": "date"},
+}
+
+
+def _page(pid: str, name: str, status: str, tags: list, estimate: float, done: bool, due: str | None,
+          edited: str = "2024-05-01T10:00:00.000Z") -> dict:
+    return {
+        "id": pid,
+        "created_time": "2024-04-01T10:00:00.000Z",
+        "last_edited_time": edited,
+        "properties": {
+            "Name": {"type": "title", "title": [{"plain_text": name}]},
+            "Status": {"type": "status", "status": {"name": status}},
+            "Tags": {"type": "multi_select", "multi_select": [{"name": t} for t in tags]},
+            "Estimate": {"type": "number", "number": estimate},
+            "Done": {"type": "checkbox", "checkbox": done},
+            "Due": {"type": "date", "date": {"start": due} if due else None},
+        },
+    }
+
+
+class FakeDatabases:
+    def __init__(self, pages: list) -> None:
+        self.pages = pages
+        self.calls: list = []
+
+    async def query(self, **kwargs):
+        self.calls.append(kwargs)
+        results = self.pages
+        if "filter" in kwargs:
+            since = kwargs["filter"]["last_edited_time"]["on_or_after"]
+            results = [p for p in results if p["last_edited_time"] >= since]
+        return {"results": results, "has_more": False}
+
+
+class FakeNotion:
+    def __init__(self, pages: list) -> None:
+        self.databases = FakeDatabases(pages)
+
+
+def _mirror(pages: list) -> tuple[NotionMirror, FakeNotion]:
+    mirror = NotionMirror(":memory:")
+    notion = FakeNotion(pages)
+    asyncio.run(mirror.sync_database(notion, "db-1", json.dumps(SCHEMA)))
+    return mirror, notion
+
+
+def _names(rows: list) -> list:
+    return sorted(r["properties"]["Name"] for r in rows)
+
+
+def test_query_matches_filters_locally():
+    mirror, _ = _mirror([
+        _page("a", "Write report", "In progress", ["Work"], 3, False, "2024-05-02"),
+        _page("b", "Buy milk", "Done", ["Home", "Errand"], 1, True, None),
+        _page("c", "Plan trip", "Not started", ["Home"], 5, False, "2024-06-10T09:00:00-04:00"),
+    ])
+    schema = json.dumps(SCHEMA)
+
+    rows = mirror.query("db-1", schema, {"and": [
+        {"property": "Done", "checkbox": {"equals": False}},
+        {"property": "Estimate", "number": {"greater_than": 2}},
+    ]})
+    assert _names(rows) == ["Plan trip", "Write report"]
+
+    rows = mirror.query("db-1", schema, {"property": "tg", "multi_select": {"contains": "Home"}})
+    assert _names(rows) == ["Buy milk", "Plan trip"]
+
+    rows = mirror.query("db-1", schema, {"or": [
+        {"property": "Name", "title": {"contains": "MILK"}},
+        {"property": "Due", "date": {"on_or_after": "2024-06-10"}},
+    ]})
+    assert _names(rows) == ["Buy milk", "Plan trip"]
+
+    assert mirror.query("db-1", schema, {"property": "Due", "date": {"is_empty": True}})[0] == {
+        "id": "b",
+        "properties": {"Name": "Buy milk", "Status": "Done", "Tags": ["Home", "Errand"],
+                       "Estimate": 1, "Done": True, "Due": None},
+    }
+
+
+def test_query_falls_back_when_unsupported_or_stale():
+    mirror, _ = _mirror([_page("a", "Write report", "Done", [], 1, True, None)])
+    schema = json.dumps(SCHEMA)
+
+    assert mirror.query("db-1", schema, {"property": "Due", "date": {"this_week": {}}}) is None
+    assert mirror.query("db-2", schema, None) is None
+    assert mirror.query("db-1", json.dumps({"Other": {"type": "title"}}), None) is None
+
+    mirror.max_staleness = -1
+    assert mirror.query("db-1", schema, None) is None
+    assert mirror.stats == {"local_hits": 0, "stale": 3, "unsupported": 1}
+
+
+def test_incremental_sync_only_fetches_edited_rows():
+    pages = [
+        _page("a", "Old", "Done", [], 1, True, None, edited="2024-04-20T10:00:00.000Z"),
+        _page("b", "Recent", "Done", [], 1, True, None, edited="2024-05-01T10:00:00.000Z"),
+    ]
+    mirror, notion = _mirror(pages)
+    pages.append(_page("c", "New", "Done", [], 1, True, None, edited="2024-05-02T10:00:00.000Z"))
+
+    written = asyncio.run(mirror.sync_database(notion, "db-1", json.dumps(SCHEMA)))
+
+    assert written == 2
+    assert notion.databases.calls[-1]["filter"] == {
+        "timestamp": "last_edited_time",
+        "last_edited_time": {"on_or_after": "2024-05-01T10:00:00.000Z"},
+    }
+    assert _names(mirror.query("db-1", json.dumps(SCHEMA), None)) == ["New", "Old", "Recent"]
+
+
+def test_full_sync_removes_deleted_rows():
+    pages = [_page("a", "Keep", "Done", [], 1, True, None), _page("b", "Gone", "Done", [], 1, True, None)]
+    mirror, notion = _mirror(pages)
+    del pages[1]
+
+    asyncio.run(mirror.sync_database(notion, "db-1", json.dumps(SCHEMA), full=True))
+
+    assert _names(mirror.query("db-1", json.dumps(SCHEMA), None)) == ["Keep"]
+
+
+def test_filter_to_sql_rejects_unknown_properties():
+    with pytest.raises(UnsupportedFilterError):
+        filter_to_sql({"property": "Missing", "title": {"equals": "x"}}, schema_columns(SCHEMA))
+    with pytest.raises(UnsupportedFilterError):
+        filter_to_sql({"property": "Name", "number": {"equals": 1}}, schema_columns(SCHEMA))
+
+
+def test_query_projects_properties_and_limits_rows():
+    mirror, _ = _mirror([
+        _page("a", "Write report", "Done", [], 1, True, None),
+        _page("b", "Buy milk", "Done", [], 1, True, None),
+    ])
+
+    rows = mirror.query("db-1", json.dumps(SCHEMA), None, properties=["Name", "Missing"], limit=1)
+
+    assert rows == [{"id": "a", "properties": {"Name": "Write report"}}]
+
+
+def test_query_returns_one_page_newest_first_like_notion():
+    pages = []
+    for n in range(105):
+        page = _page(f"p{n:03}", f"Item {n}", "Done", [], n, True, None)
+        page["created_time"] = f"2024-04-01T10:{n // 60:02}:{n % 60:02}.000Z"
+        pages.append(page)
+    mirror, _ = _mirror(pages)
+
+    rows = mirror.query("db-1", json.dumps(SCHEMA), None)
+
+    assert len(rows) == 100
+    assert [r["id"] for r in rows[:2]] == ["p104", "p103"]
+    assert rows[-1]["id"] == "p005"
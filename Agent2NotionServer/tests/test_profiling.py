@@ -0,0 +1,63 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import profiling
+from profiling import PROFILES, ProfilingMiddleware, get_profile, span
+
+
+async def _app(scope, receive, send):
+    with span("outer", kind="test"):
+        with span("notion.databases.query"):
+            await asyncio.sleep(0.01)
+        with span("simplify"):
+            deadline = time.perf_counter() + 0.03
+            while time.perf_counter() < deadline:
+                pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _request(middleware: ProfilingMiddleware, headers: list) -> list:
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/search-notion", "headers": headers}
+    asyncio.run(middleware(scope, None, send))
+    return sent
+
+
+def test_profiles_requests_with_the_admin_header():
+    PROFILES.clear()
+    middleware = ProfilingMiddleware(_app, token="admin")
+
+    sent = _request(middleware, [(b"x-profile", b"admin")])
+
+    profile_id = dict(sent[0]["headers"])[b"x-profile-id"].decode()
+    profile = get_profile(profile_id).to_dict()
+    assert profile["path"] == "/search-notion"
+    outer, query, simplify = profile["spans"]
+    assert (outer["name"], outer["parent"], outer["kind"]) == ("outer", None, "test")
+    assert query["parent"] == simplify["parent"] == outer["id"]
+    assert simplify["duration_ms"] >= 30
+    assert any("_app" in s["stack"] for s in profile["samples"])
+
+
+def test_unprofiled_requests_record_nothing():
+    PROFILES.clear()
+    middleware = ProfilingMiddleware(_app, token="admin", sample_rate=0)
+
+    sent = _request(middleware, [(b"x-profile", b"wrong")])
+    _request(middleware, [])
+
+    assert sent[0]["headers"] == []
+    assert len(PROFILES) == 0
+    assert span("anything") is profiling._NOOP
+    assert profiling._sampler.thread is None or not profiling._sampler.active
@@ -0,0 +1,82 @@
+import sys
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import query_cache
+from query_cache import QueryCache
+
+QUERY = {"database_id": "db-1", "filter": {"property": "Status", "status": {"equals": "Done"}}}
+
+
+class FakeDatabases:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.calls = 0
+
+    async def query(self, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("client has been closed")
+        return {"results": [{"id": f"row-{self.calls}"}], "query": kwargs}
+
+
+class FakeNotion:
+    def __init__(self, fail: bool = False) -> None:
+        self.databases = FakeDatabases(fail)
+
+
+def test_get_returns_fresh_responses_only(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache, notion = QueryCache(ttl=10), FakeNotion()
+
+    assert cache.get(notion, QUERY) is None
+    cache.put(notion, QUERY, {"results": []})
+    # Key order in the filter does not matter
+    assert cache.get(notion, dict(reversed(QUERY.items()))) == {"results": []}
+    # Another workspace with the same query does not share the entry
+    assert cache.get(FakeNotion(), QUERY) is None
+
+    now[0] += 11
+    assert cache.get(notion, QUERY) is None
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 3
+
+
+def test_warm_refreshes_hot_queries_and_decays_hits():
+    cache, notion = QueryCache(hot_hits=2, warm_rate=1000), FakeNotion()
+    cold = {"database_id": "db-2"}
+    for _ in range(2):
+        cache.get(notion, QUERY)
+    cache.get(notion, cold)
+
+    assert asyncio.run(cache.warm()) == 1
+    assert notion.databases.calls == 1
+    assert cache.get(notion, QUERY)["results"] == [{"id": "row-1"}]
+    assert cache.get(notion, cold) is None
+
+    # Hits halve after every pass, so a query that is no longer asked for cools down
+    asyncio.run(cache.warm())
+    assert cache.hot() == []
+
+
+def test_invalidate_drops_responses_but_keeps_entries_hot():
+    cache, notion = QueryCache(hot_hits=1, warm_rate=1000), FakeNotion()
+    cache.get(notion, QUERY)
+    cache.put(notion, QUERY, {"results": []})
+
+    cache.invalidate(notion)
+
+    assert cache.get(notion, QUERY) is None
+    assert len(cache.hot()) == 1
+
+
+def test_failing_queries_are_dropped():
+    cache, notion = QueryCache(hot_hits=1, warm_rate=1000), FakeNotion(fail=True)
+    cache.get(notion, QUERY)
+
+    assert asyncio.run(cache.warm()) == 0
+    assert cache.snapshot() == {"hits": 0, "misses": 1, "warmed": 0, "warm_errors": 1, "entries": 0, "hot": 0}
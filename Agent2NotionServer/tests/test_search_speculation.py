@@ -0,0 +1,129 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import notion_tools
+from notion_index import PageIndex
+from notion_tools import SearchAgentOutput, rank_databases, search_notion_data
+
+TOOL_DATA = [
+    {"id": "tasks", "type": "database", "title": "Tasks", "summary": "Things to do",
+     "schema": json.dumps({"Name": {"id": "title", "type": "title"}, "Priority": {"id": "pr", "type": "select"}})},
+    {"id": "books", "type": "database", "title": "Reading list", "summary": "Books and priority reads",
+     "schema": json.dumps({"Name": {"id": "title", "type": "title"}})},
+    {"id": "recipes", "type": "database", "title": "Recipes", "summary": "Dinner ideas", "schema": "{}"},
+]
+
+
+class FakeDatabases:
+    async def query(self, **kwargs):
+        return {"results": [{"id": "row", "properties": {"Name": {"type": "title", "title": [{"plain_text": kwargs["database_id"]}]}}}]}
+
+
+class FakeNotion:
+    databases = FakeDatabases()
+
+
+def test_rank_databases_prefers_title_matches():
+    assert rank_databases("What are my tasks with a priority of Today?", TOOL_DATA) == ["tasks", "books"]
+
+
+def test_speculative_filters_are_used_or_discarded(monkeypatch):
+    started, finished = [], []
+
+    async def fake_agent(query, tool_data):
+        await asyncio.sleep(0.02)
+        return SearchAgentOutput(database_ids=["tasks", "recipes"])
+
+    async def fake_filter(query, schema_json, guide_text, db_id, custom_instructions=None):
+        started.append(db_id)
+        await asyncio.sleep(0.05 if db_id == "books" else 0.01)
+        finished.append(db_id)
+        return {"filter": {}}
+
+    monkeypatch.setattr(notion_tools, "run_search_agent", fake_agent)
+    monkeypatch.setattr(notion_tools, "build_db_filter", fake_filter)
+    monkeypatch.setattr(notion_tools, "SPECULATION_WIDTH", 2)
+    monkeypatch.setattr(notion_tools, "SPECULATION_STATS", {"speculated": 0, "used": 0, "wasted": 0, "cancelled": 0})
+
+    result = asyncio.run(search_notion_data("my tasks by priority", FakeNotion(), TOOL_DATA, "guide", {}))
+
+    assert result["databases"] == {
+        "tasks": [{"id": "row", "properties": {"Name": "tasks"}}],
+        "recipes": [{"id": "row", "properties": {"Name": "recipes"}}],
+    }
+    assert started == ["tasks", "books", "recipes"]
+    assert "books" not in finished
+    assert notion_tools.SPECULATION_STATS == {"speculated": 2, "used": 1, "wasted": 1, "cancelled": 1}
+
+
+def test_no_ranking_without_speculation(monkeypatch):
+    async def fake_agent(query, tool_data):
+        return SearchAgentOutput(database_ids=["tasks"])
+
+    async def fake_filter(query, schema_json, guide_text, db_id, custom_instructions=None):
+        return {"filter": {}}
+
+    def no_ranking(query, tool_data):
+        raise AssertionError("databases ranked with speculation disabled")
+
+    monkeypatch.setattr(notion_tools, "run_search_agent", fake_agent)
+    monkeypatch.setattr(notion_tools, "build_db_filter", fake_filter)
+    monkeypatch.setattr(notion_tools, "rank_databases", no_ranking)
+    monkeypatch.setattr(notion_tools, "SPECULATION_WIDTH", 0)
+
+    result = asyncio.run(search_notion_data("my tasks", FakeNotion(), TOOL_DATA, "guide", {}))
+
+    assert list(result["databases"]) == ["tasks"]
+
+
+def test_speculative_filters_are_cancelled_when_the_search_fails(monkeypatch):
+    cancelled = []
+
+    async def fake_agent(query, tool_data):
+        await asyncio.sleep(0.01)
+        return SearchAgentOutput(database_ids=["recipes", "tasks"])
+
+    async def fake_filter(query, schema_json, guide_text, db_id, custom_instructions=None):
+        if db_id == "recipes":
+            raise RuntimeError("invalid filter")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(db_id)
+            raise
+
+    monkeypatch.setattr(notion_tools, "run_search_agent", fake_agent)
+    monkeypatch.setattr(notion_tools, "build_db_filter", fake_filter)
+    monkeypatch.setattr(notion_tools, "SPECULATION_WIDTH", 1)
+
+    async def scenario():
+        try:
+            await search_notion_data("my tasks", FakeNotion(), TOOL_DATA, "guide", {})
+        except RuntimeError:
+            pass
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left over
+        assert cancelled == ["tasks"]
+
+    asyncio.run(scenario())
+
+
+def test_selected_indexed_pages_without_text_are_kept(monkeypatch):
+    async def fake_agent(query, tool_data):
+        return SearchAgentOutput(page_ids=["empty", "notes"])
+
+    index = PageIndex()
+    index.add_page("notes", [{"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": "Budget review"}]}}])
+    index.add_page("empty", [{"type": "divider", "divider": {}}])
+    monkeypatch.setattr(notion_tools, "run_search_agent", fake_agent)
+    monkeypatch.setattr(notion_tools, "SPECULATION_WIDTH", 0)
+
+    result = asyncio.run(search_notion_data("budget", FakeNotion(), TOOL_DATA, "guide", {}, page_index=index))
+
+    assert result["pages"] == {"notes": "Budget review", "empty": ""}
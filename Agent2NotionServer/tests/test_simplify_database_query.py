@@ -0,0 +1,65 @@
+import sys
+import json
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from notion_tools import _simplify_database_query, compact_schema
+from tests.simplify_fixtures import SCHEMA, make_payload, per_cell
+
+
+def test_compiled_extractor_matches_per_cell_dispatch():
+    resp = make_payload(50)
+
+    assert _simplify_database_query(resp, json.dumps(SCHEMA)) == per_cell(resp)
+
+
+def test_columnar_output():
+    resp = make_payload(3)
+
+    columns = _simplify_database_query(resp, json.dumps(SCHEMA), columnar=True)
+
+    assert columns["id"] == ["page-0", "page-1", "page-2"]
+    assert columns["properties"]["Name"] == ["Task 0", "Task 1", "Task 2"]
+    assert columns["properties"]["Priority"] == [None, "High", None]
+    assert columns["properties"]["Notes"] == ["Some notes"] * 3
+
+
+def test_schema_drift_falls_back_to_generic_extraction():
+    resp = make_payload(2)
+    stale_schema = dict(SCHEMA, Estimate={"id": "es", "type": "rich_text"})
+
+    assert _simplify_database_query(resp, json.dumps(stale_schema)) == per_cell(resp)
+    assert _simplify_database_query(resp, json.dumps(stale_schema), columnar=True)["properties"]["Estimate"] == [0, 1]
+
+
+def test_projection_with_and_without_filter_properties():
+    resp = make_payload(2)
+    schema_json = json.dumps(SCHEMA)
+    expected = [{"id": f"page-{i}", "properties": {"Name": f"Task {i}", "Done": bool(i % 3)}} for i in range(2)]
+
+    assert _simplify_database_query(resp, schema_json, properties=["Name", "Done"]) == expected
+
+    # Notion already dropped the other properties (``filter_properties``).
+    for page in resp["results"]:
+        page["properties"] = {n: page["properties"][n] for n in ("Name", "Done")}
+    assert _simplify_database_query(resp, schema_json, properties=["Name", "Done"]) == expected
+    assert _simplify_database_query(resp, None, properties=["Name", "Done"]) == expected
+
+
+def test_compact_schema_keeps_names_types_and_option_names():
+    raw = json.dumps({
+        "Name": {"id": "title", "name": "Name", "type": "title", "title": {}},
+        "Status": {"id": "s%3B", "name": "Status", "type": "status", "status": {
+            "options": [{"id": "1", "name": "Not started", "color": "default"}, {"id": "2", "name": "Done", "color": "green"}],
+            "groups": [{"id": "g", "name": "To-do", "option_ids": ["1"]}],
+        }},
+        "Tags": {"id": "t", "name": "Tags", "type": "multi_select", "multi_select": {"options": []}},
+        "Due": {"id": "d", "name": "Due", "type": "date", "date": {}},
+    })
+
+    assert compact_schema(raw) == (
+        '{"Name":"title","Status":{"status":["Not started","Done"]},"Tags":{"multi_select":[]},"Due":"date"}'
+    )
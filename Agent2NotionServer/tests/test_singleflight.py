@@ -0,0 +1,73 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from singleflight import SingleFlight, coalesce
+
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight("test-share")
+    calls = []
+
+    @coalesce(group, lambda a: a["x"])
+    async def work(x: int, delay: float = 0.01) -> int:
+        calls.append(x)
+        await asyncio.sleep(delay)
+        return x * 2
+
+    async def run():
+        return await asyncio.gather(work(1), work(1), work(x=1, delay=0.5), work(2))
+
+    assert asyncio.run(run()) == [2, 2, 2, 4]
+    assert calls == [1, 2]
+    assert group.stats == {"calls": 4, "coalesced": 2}
+
+
+def test_exceptions_are_shared_and_key_is_released():
+    group = SingleFlight("test-errors")
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def run():
+        results = await asyncio.gather(group.do("k", fail), group.do("k", fail), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await group.do("k", fail)
+
+    asyncio.run(run())
+    assert len(attempts) == 2
+
+
+def test_shared_call_survives_one_caller_cancelling():
+    group = SingleFlight("test-cancel")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(group.do("k", slow))
+        second = asyncio.create_task(group.do("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+        # When every caller gives up, the shared work is cancelled too.
+        only = asyncio.create_task(group.do("k2", slow))
+        await asyncio.sleep(0)
+        task = group._calls["k2"].task
+        only.cancel()
+        await asyncio.gather(only, task, return_exceptions=True)
+        assert task.cancelled()
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import sys
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import notion_tools
+from notion_tools import BatchSummaryOutput, ItemSummary, _pack_batches, summarize_items
+
+
+class FakeLLM:
+    """Stands in for ChatOpenAI; answers batches for every key except ``item1``."""
+    requests: list = []
+
+    def __init__(self, **kwargs) -> None:
+        self.structured = False
+
+    def with_structured_output(self, schema):
+        self.structured = True
+        return self
+
+    async def ainvoke(self, messages):
+        text = messages[-1].content
+        FakeLLM.requests.append(text)
+        if not self.structured:
+            return type("Msg", (), {"content": "solo: " + text.splitlines()[0]})()
+        keys = [line[1:line.index("]")] for line in text.splitlines() if line.startswith("[item")]
+        return BatchSummaryOutput(summaries=[ItemSummary(key=k, summary=f"batched {k}") for k in keys if k != "item1"])
+
+
+def test_pack_batches_respects_budget():
+    items = [("a", "page", "x" * 40), ("b", "page", "x" * 40), ("c", "page", "x" * 400), ("d", "page", "x")]
+
+    assert [[i[0] for i in batch] for batch in _pack_batches(items, 25)] == [["a", "b"], ["c"], ["d"]]
+
+
+def test_summarize_items_batches_and_retries_missing(monkeypatch):
+    monkeypatch.setattr(notion_tools, "ChatOpenAI", FakeLLM)
+    FakeLLM.requests = []
+    items = [("db-1", "database", "Database name: Tasks"), ("p-1", "page", "Page title: Notes"),
+             ("p-2", "page", "Page title: Ideas")]
+
+    summaries = asyncio.run(summarize_items(items, budget=1000))
+
+    assert summaries == {"db-1": "batched item0", "p-1": "solo: Page title: Notes", "p-2": "batched item2"}
+    assert len(FakeLLM.requests) == 2
+
+
+def test_summarize_items_without_batching(monkeypatch):
+    monkeypatch.setattr(notion_tools, "ChatOpenAI", FakeLLM)
+    FakeLLM.requests = []
+
+    summaries = asyncio.run(summarize_items([("p-1", "page", "Page title: Solo")], budget=0))
+
+    assert summaries == {"p-1": "solo: Page title: Solo"}
+    assert len(FakeLLM.requests) == 1
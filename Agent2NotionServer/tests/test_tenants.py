@@ -0,0 +1,113 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import tenants
+from tenants import TenantConfig, TenantRegistry, load_tenant_configs_from_env
+
+
+class FakeClient:
+    def __init__(self, auth=None) -> None:
+        self.auth = auth
+        self.closed = False
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def _registry(monkeypatch, tmp_path, names: list, capacity: int) -> tuple[TenantRegistry, list]:
+    monkeypatch.setattr(tenants, "AsyncClient", FakeClient)
+    loads = []
+    configs = {}
+    for name in names:
+        catalog = tmp_path / f"{name}.json"
+        catalog.write_text(json.dumps([{"id": f"{name}-db", "type": "database", "title": name}]))
+        instructions = tmp_path / f"{name}-instructions.json"
+        instructions.write_text("{}")
+        configs[f"key-{name}"] = TenantConfig(
+            name=name,
+            notion_token=f"token-{name}",
+            tool_data_path=str(catalog),
+            db_instructions_path=str(instructions),
+        )
+    monkeypatch.setattr(tenants, "load_page_index", lambda path, key: loads.append(key))
+    return TenantRegistry(configs, capacity), loads
+
+
+def test_tenants_are_loaded_once_and_evicted_lru(monkeypatch, tmp_path):
+    registry, loads = _registry(monkeypatch, tmp_path, ["a", "b", "c"], capacity=2)
+    config = registry.config_for
+
+    async def use(key: str):
+        async with registry.acquire(config(key)) as tenant:
+            return tenant
+
+    async def scenario():
+        first, second = await asyncio.gather(use("key-a"), use("key-a"))
+        assert first is second
+        assert first.tool_data[0]["id"] == "a-db"
+        assert first.notion.auth == "token-a"
+        await use("key-b")
+        await use("key-a")
+        await use("key-c")
+        return first
+
+    tenant_a = asyncio.run(scenario())
+
+    assert [t.name for t in registry.loaded()] == ["a", "c"]
+    assert loads == ["a/notion_page_index.json", "b/notion_page_index.json", "c/notion_page_index.json"]
+    assert registry.stats == {"hits": 1, "loads": 3, "evictions": 1}
+    assert not tenant_a.notion.closed
+    assert registry.config_for("unknown") is None
+
+
+def test_evicted_tenant_stays_open_until_released(monkeypatch, tmp_path):
+    registry, _ = _registry(monkeypatch, tmp_path, ["a", "b"], capacity=1)
+
+    async def scenario():
+        async with registry.acquire(registry.config_for("key-a")) as tenant_a:
+            async with registry.acquire(registry.config_for("key-b")):
+                pass
+            assert tenant_a.evicted and not tenant_a.notion.closed
+        return tenant_a
+
+    assert asyncio.run(scenario()).notion.closed
+
+
+def test_concurrent_loads_at_capacity_hand_out_open_tenants(monkeypatch, tmp_path):
+    registry, _ = _registry(monkeypatch, tmp_path, ["a", "b", "c"], capacity=1)
+
+    async def use(key: str):
+        async with registry.acquire(registry.config_for(key)) as tenant:
+            closed = tenant.notion.closed
+            await asyncio.sleep(0)
+            return tenant, closed or tenant.notion.closed
+
+    async def scenario():
+        return await asyncio.gather(*(use(f"key-{name}") for _ in range(10) for name in "abc"))
+
+    for _ in range(20):
+        used = asyncio.run(scenario())
+        assert not any(closed for _, closed in used)
+        # Every evicted tenant is closed once its last request is done
+        assert all(t.notion.closed for t, _ in used if t.evicted)
+        assert not registry._waiting and not registry._draining
+        asyncio.run(registry.aclose())
+
+
+def test_tenant_configs_from_file(monkeypatch, tmp_path):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps({"key-1": {"name": "acme", "notion_token_env": "ACME_NOTION_TOKEN"}}))
+    monkeypatch.setenv("NOTION_TENANTS_PATH", str(path))
+    monkeypatch.setenv("ACME_NOTION_TOKEN", "secret")
+
+    config = load_tenant_configs_from_env()["key-1"]
+
+    assert config.notion_token == "secret"
+    assert config.tool_data_key == "acme/notion_tools_data.json"
+    assert config.db_instructions_key == "acme/db_custom_instructions.json"
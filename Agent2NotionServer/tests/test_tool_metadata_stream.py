@@ -0,0 +1,147 @@
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+import notion_tools
+from notion_tools import generate_and_cache_tool_metadata, load_tool_data
+from notion_index import load_page_index
+
+
+def _page(pid: str, title: str, parent: str = "workspace") -> dict:
+    return {
+        "object": "page",
+        "id": pid,
+        "parent": {"type": parent},
+        "properties": {"title": {"type": "title", "title": [{"plain_text": title}]}},
+    }
+
+
+WORKSPACE = [
+    {"object": "database", "id": "db-1", "title": [{"plain_text": "Tasks"}], "properties": {"Name": {"type": "title"}}},
+    _page("row-1", "A task", parent="database_id"),
+    _page("page-1", "Journal"),
+    _page("page-2", "Ideas"),
+]
+
+
+class FakeNotion:
+    def __init__(self, **kwargs) -> None:
+        self.searches: list = []
+        self.databases = self
+        self.blocks = self
+        self.children = self
+
+    async def search(self, **kwargs):
+        self.searches.append(kwargs)
+        start = int(kwargs.get("start_cursor") or 0)
+        # Two results per response to exercise the cursor
+        end = start + 2
+        return {"results": WORKSPACE[start:end], "has_more": end < len(WORKSPACE), "next_cursor": str(end)}
+
+    async def query(self, **kwargs):
+        return {"results": []}
+
+    async def list(self, **kwargs):
+        return {"results": [{"type": "paragraph", "paragraph": {"rich_text": [{"plain_text": "text"}]}}]}
+
+    async def aclose(self):
+        pass
+
+
+def test_streaming_crawl_writes_ndjson_in_batches(monkeypatch, tmp_path):
+    clients, batches = [], []
+
+    def make_client(**kwargs):
+        clients.append(FakeNotion())
+        return clients[-1]
+
+    async def fake_summarize(items, budget):
+        batches.append([i[0] for i in items])
+        return {item_id: f"about {item_id}" for item_id, _, _ in items}
+
+    monkeypatch.setattr(notion_tools, "AsyncClient", make_client)
+    monkeypatch.setattr(notion_tools, "summarize_items", fake_summarize)
+
+    path = tmp_path / "tools.ndjson"
+    count = asyncio.run(generate_and_cache_tool_metadata(str(path)))
+
+    assert count == 3
+    # One cursor pass over both object types at the maximum page size
+    assert [s.get("filter") for s in clients[0].searches] == [None, None]
+    assert all(s["page_size"] == 100 for s in clients[0].searches)
+    # Row pages of databases are skipped before summarization
+    assert batches == [["db-1", "page-1", "page-2"]]
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[0]) == {
+        "id": "db-1", "type": "database", "title": "Tasks", "summary": "about db-1",
+        "schema": json.dumps({"Name": {"type": "title"}}),
+    }
+    assert load_tool_data(str(path)) == [json.loads(line) for line in lines]
+
+    array_path = tmp_path / "tools.json"
+    asyncio.run(generate_and_cache_tool_metadata(str(array_path)))
+    assert json.loads(array_path.read_text()) == load_tool_data(str(path))
+
+
+def test_items_are_yielded_as_each_batch_finishes(monkeypatch):
+    events = []
+
+    async def fake_summarize(items, budget):
+        events.append(("summarized", [i[0] for i in items]))
+        return {item_id: "summary" for item_id, _, _ in items}
+
+    monkeypatch.setattr(notion_tools, "AsyncClient", FakeNotion)
+    monkeypatch.setattr(notion_tools, "summarize_items", fake_summarize)
+
+    async def consume():
+        async for metadata in notion_tools.stream_tool_metadata(budget=0):
+            events.append(("yielded", metadata["id"]))
+
+    asyncio.run(consume())
+
+    assert events == [
+        ("summarized", ["db-1"]), ("yielded", "db-1"),
+        ("summarized", ["page-1"]), ("yielded", "page-1"),
+        ("summarized", ["page-2"]), ("yielded", "page-2"),
+    ]
+
+
+def test_page_index_is_written_alongside(monkeypatch, tmp_path):
+    async def fake_summarize(items, budget):
+        return {item_id: "summary" for item_id, _, _ in items}
+
+    monkeypatch.setattr(notion_tools, "AsyncClient", FakeNotion)
+    monkeypatch.setattr(notion_tools, "summarize_items", fake_summarize)
+
+    index_path = tmp_path / "index.json"
+    asyncio.run(generate_and_cache_tool_metadata(str(tmp_path / "tools.ndjson"), str(index_path)))
+
+    index = load_page_index(str(index_path))
+    assert index.page_ids == ["page-1", "page-2"]
+    assert index.search("text", ["page-2"])["page-2"][0]["text"] == "text"
+
+
+def test_failed_refresh_keeps_the_previous_files(monkeypatch, tmp_path):
+    async def failing_summarize(items, budget):
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(notion_tools, "AsyncClient", FakeNotion)
+    monkeypatch.setattr(notion_tools, "summarize_items", failing_summarize)
+
+    path, index_path = tmp_path / "tools.json", tmp_path / "index.json"
+    path.write_text('[{"id": "db-1"}]')
+    index_path.write_text("{}")
+
+    try:
+        asyncio.run(generate_and_cache_tool_metadata(str(path), str(index_path)))
+    except RuntimeError:
+        pass
+
+    assert load_tool_data(str(path)) == [{"id": "db-1"}]
+    assert index_path.read_text() == "{}"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index.json", "tools.json"]